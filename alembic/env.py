@@ -6,14 +6,16 @@ from alembic import context
 # Import your models
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(__file__))  # online_ddl for the migrations
 from models import Base
-from database import SQLALCHEMY_DATABASE_URL
+from database import DATABASE_URL
 
 # this is the Alembic Config object
 config = context.config
 
 # Override sqlalchemy.url with your database URL
-config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+# (% is configparser's interpolation character; passwords may contain it)
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # Interpret the config file for Python logging
 if config.config_file_name is not None:
@@ -41,6 +43,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -61,8 +64,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # One transaction per revision, so an index build that finished
+        # stays applied if a later revision fails
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
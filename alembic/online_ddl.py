@@ -0,0 +1,119 @@
+"""Schema changes that can run against a live database.
+
+Migrations from 002 on go through these helpers instead of calling op.*
+directly. Every helper checks the live schema first, because most
+databases got their tables from Base.metadata.create_all() at startup
+rather than from 001, so a column, table or index may already be there.
+
+- MySQL: ADD COLUMN tries ALGORITHM=INSTANT first and falls back to
+  INPLACE with LOCK=NONE. Indexes are always built with ALGORITHM=INPLACE
+  and LOCK=NONE. Reads and writes carry on during the build.
+- PostgreSQL: indexes are built with CREATE INDEX CONCURRENTLY, outside
+  the migration's transaction.
+- SQLite: plain DDL. There is only one writer anyway.
+
+Data fixes run inside op.get_context().autocommit_block() in chunks of
+BATCH_SIZE rows. Each chunk commits on its own, so no transaction holds
+row locks across a big table.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.schema import CreateColumn
+
+# Rows per statement for backfills and dedupes
+BATCH_SIZE = 1000
+
+
+def dialect() -> str:
+    return op.get_bind().dialect.name
+
+def inspector():
+    # A fresh inspector each time; a cached one would not see earlier steps
+    return sa.inspect(op.get_bind())
+
+def has_table(table: str) -> bool:
+    return inspector().has_table(table)
+
+def has_column(table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspector().get_columns(table)}
+
+def index_columns(table: str) -> dict:
+    """index or unique constraint name -> column list"""
+    insp = inspector()
+    found = {ix["name"]: ix["column_names"] for ix in insp.get_indexes(table)}
+    for uc in insp.get_unique_constraints(table):
+        found[uc["name"]] = uc["column_names"]
+    return found
+
+def has_index(table: str, name: str, columns: list) -> bool:
+    """True if the index exists by name, or under another name with the same columns"""
+    existing = index_columns(table)
+    return name in existing or list(columns) in existing.values()
+
+
+# ==================== TABLES AND COLUMNS ====================
+
+def create_table(table: str, *columns, **kw) -> bool:
+    """Create the table unless it exists; a new table never blocks anything"""
+    if has_table(table):
+        return False
+    op.create_table(table, *columns, **kw)
+    return True
+
+def add_column(table: str, column: sa.Column) -> bool:
+    """Add a nullable column unless it exists"""
+    if has_column(table, column.name):
+        return False
+    if dialect() == "mysql":
+        bind = op.get_bind()
+        ddl = CreateColumn(column).compile(dialect=bind.dialect)
+        try:
+            op.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}, ALGORITHM=INSTANT")
+        except sa.exc.DBAPIError:
+            # MySQL before 8.0.12, or a table INSTANT cannot handle
+            op.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}, ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        # SQLite and PostgreSQL only touch the catalog for a nullable column with no default
+        op.add_column(table, column)
+    return True
+
+def drop_column(table: str, column: str):
+    if has_column(table, column):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column)
+
+
+# ==================== INDEXES ====================
+
+def create_index(name: str, table: str, columns: list, unique: bool = False) -> bool:
+    """Build an index without blocking writes, unless an equivalent one exists"""
+    if has_index(table, name, columns):
+        return False
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if dialect() == "mysql":
+        op.execute(f"ALTER TABLE {table} ADD {kind} {name} ({', '.join(columns)}), "
+                   f"ALGORITHM=INPLACE, LOCK=NONE")
+    elif dialect() == "postgresql":
+        with op.get_context().autocommit_block():
+            try:
+                op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+            except sa.exc.DBAPIError:
+                # A failed concurrent build leaves an INVALID index behind
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                raise
+    else:
+        op.create_index(name, table, columns, unique=unique)
+    return True
+
+def drop_index(name: str, table: str):
+    if name not in index_columns(table):
+        return
+    if dialect() == "mysql":
+        op.execute(f"ALTER TABLE {table} DROP INDEX {name}, ALGORITHM=INPLACE, LOCK=NONE")
+    elif dialect() == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        op.drop_index(name, table_name=table)
+
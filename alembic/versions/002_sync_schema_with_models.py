@@ -0,0 +1,168 @@
+"""sync schema with models
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 10:00:00.000000
+
+Adds what 001 never had: course description and background image, module
+score, the activity lookup key, and the progress, score, counter and upload
+tables. Anything Base.metadata.create_all() already created is left alone.
+
+001's resources.locked/completed and activities.completed/score columns are
+no longer mapped. They are kept: they are nullable, nothing reads them, and
+dropping a column rebuilds the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_ddl import BATCH_SIZE, add_column, create_index, create_table, drop_column, drop_index
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+NEW_TABLES = [
+    'uploaded_files', 'score_events', 'user_total_scores', 'table_counters',
+    'user_activity_progress', 'student_scores', 'user_course_progress', 'user_module_progress',
+]
+
+def upgrade() -> None:
+    add_column('courses', sa.Column('description', sa.Text()))
+    add_column('courses', sa.Column('background_image', sa.String(255)))
+    add_column('modules', sa.Column('score', sa.Float()))
+    if add_column('activities', sa.Column('name_key', sa.String(255))):
+        backfill_activity_name_keys()
+    create_index('ix_activities_name_key', 'activities', ['name_key'])
+
+    create_table('user_module_progress',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.Integer(), nullable=False),
+        sa.Column('locked', sa.Boolean()),
+        sa.Column('completed', sa.Boolean()),
+        sa.Column('last_accessed', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['module_id'], ['modules.id']),
+        sa.UniqueConstraint('user_id', 'module_id', name='uix_user_module')
+    )
+
+    create_table('user_course_progress',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('locked', sa.Boolean()),
+        sa.Column('completed', sa.Boolean()),
+        sa.Column('last_accessed', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+        sa.UniqueConstraint('user_id', 'course_id', name='uix_user_course')
+    )
+
+    create_table('student_scores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.Integer(), nullable=False),
+        sa.Column('total_score', sa.Float()),
+        sa.Column('completed_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['module_id'], ['modules.id']),
+        sa.UniqueConstraint('user_id', 'module_id', name='uix_user_module_score')
+    )
+
+    # Its (user_id, activity_id) unique key comes in 004, after the dedupe
+    create_table('user_activity_progress',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Boolean()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['activity_id'], ['activities.id'])
+    )
+
+    create_table('table_counters',
+        sa.Column('name', sa.String(64), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('reconciled_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    create_table('user_total_scores',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_score', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'])
+    )
+    create_index('ix_user_total_scores_rank', 'user_total_scores', ['total_score', 'user_id'])
+
+    create_table('score_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['module_id'], ['modules.id'], ondelete='CASCADE')
+    )
+    create_index('ix_score_events_user', 'score_events', ['user_id', 'id'])
+
+    create_table('uploaded_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('sha256', sa.String(64), nullable=False),
+        sa.Column('original_name', sa.String(255), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('uploader_id', sa.Integer()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['uploader_id'], ['users.id'], ondelete='SET NULL'),
+        sa.UniqueConstraint('filename')
+    )
+    create_index('ix_uploaded_files_sha256', 'uploaded_files', ['sha256'])
+    create_index('ix_uploaded_files_uploader_id', 'uploaded_files', ['uploader_id'])
+    create_index('ix_uploaded_files_created', 'uploaded_files', ['created_at', 'id'])
+    create_index('ix_uploaded_files_name', 'uploaded_files', ['original_name', 'id'])
+    create_index('ix_uploaded_files_size', 'uploaded_files', ['size', 'id'])
+
+
+def backfill_activity_name_keys() -> None:
+    """Fill activities.name_key in id order, one committed batch at a time"""
+    activities = sa.table('activities', sa.column('id'), sa.column('name'), sa.column('name_key'))
+    bind = op.get_bind()
+    last_id = 0
+    with op.get_context().autocommit_block():
+        while True:
+            rows = bind.execute(
+                sa.select(activities.c.id, activities.c.name)
+                .where(activities.c.id > last_id)
+                .order_by(activities.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            # Same normalization as models.activity_key
+            bind.execute(
+                activities.update().where(activities.c.id == sa.bindparam('row_id')),
+                [{'row_id': row.id, 'name_key': row.name.strip().lower()} for row in rows]
+            )
+            last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    for table in NEW_TABLES:
+        if sa.inspect(op.get_bind()).has_table(table):
+            op.drop_table(table)
+    drop_index('ix_activities_name_key', 'activities')
+    drop_column('activities', 'name_key')
+    drop_column('modules', 'score')
+    drop_column('courses', 'background_image')
+    drop_column('courses', 'description')
@@ -0,0 +1,43 @@
+"""indexes for the hot query patterns
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 10:10:00.000000
+
+One composite index per filter + ORDER BY in crud.py, main.py, progress.py
+and catalog_cache.py that had no index to use:
+
+- modules(course_id, id): a course's modules in order, and the next module
+  (progress.module_and_next, crud.unlock_next_content, the next-course step)
+- resources(module_id, id): a module's resources in order, next resource
+- videos, pdfs, activities(resource_id, id): a resource's content
+- student_scores(module_id, total_score): per-module leaderboard
+
+Lookups by user already have an index. student_scores(user_id) and the
+progress tables use the leading user_id column of their (user_id, ...)
+unique keys. user_activity_progress gets its key in 004.
+"""
+from online_ddl import create_index, drop_index
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_modules_course_id_id', 'modules', ['course_id', 'id']),
+    ('ix_resources_module_id_id', 'resources', ['module_id', 'id']),
+    ('ix_videos_resource_id_id', 'videos', ['resource_id', 'id']),
+    ('ix_pdfs_resource_id_id', 'pdfs', ['resource_id', 'id']),
+    ('ix_activities_resource_id_id', 'activities', ['resource_id', 'id']),
+    ('ix_student_scores_module_score', 'student_scores', ['module_id', 'total_score']),
+]
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        create_index(name, table, columns)
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        drop_index(name, table)
@@ -0,0 +1,88 @@
+"""unique (user_id, activity_id) on user_activity_progress
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 10:20:00.000000
+
+user_activity_progress never had a unique key. Two completion requests
+racing could each insert a row, so some (user, activity) pairs have
+several rows. For each pair this keeps one row: the lowest-id completed
+row, or the lowest-id row if none is completed. The other rows are
+deleted, then the unique index is built online.
+
+The app keeps writing while this runs, so a new duplicate can appear
+between the dedupe and the end of the index build. The build then fails
+cleanly and is retried after another dedupe.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_ddl import BATCH_SIZE, create_index, dialect, drop_index, index_columns
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+NAME = 'uix_user_activity'
+ATTEMPTS = 3
+
+progress = sa.table('user_activity_progress',
+                    sa.column('id'), sa.column('user_id'), sa.column('activity_id'), sa.column('completed'))
+
+def duplicate_ids() -> list:
+    """Ids of every row that is not the one kept for its (user_id, activity_id)"""
+    groups = (
+        sa.select(progress.c.user_id, progress.c.activity_id)
+        .group_by(progress.c.user_id, progress.c.activity_id)
+        .having(sa.func.count() > 1)
+        .subquery()
+    )
+    rows = op.get_bind().execute(
+        sa.select(progress.c.id, progress.c.user_id, progress.c.activity_id, progress.c.completed)
+        .join(groups, sa.and_(progress.c.user_id == groups.c.user_id,
+                              progress.c.activity_id == groups.c.activity_id))
+        .order_by(progress.c.user_id, progress.c.activity_id, progress.c.id)
+    ).all()
+    keep = {}
+    for row in rows:
+        key = (row.user_id, row.activity_id)
+        if key not in keep or (row.completed and not keep[key].completed):
+            keep[key] = row
+    kept = {row.id for row in keep.values()}
+    return [row.id for row in rows if row.id not in kept]
+
+def dedupe() -> int:
+    with op.get_context().autocommit_block():
+        ids = duplicate_ids()
+        for i in range(0, len(ids), BATCH_SIZE):
+            op.get_bind().execute(progress.delete().where(progress.c.id.in_(ids[i:i + BATCH_SIZE])))
+    return len(ids)
+
+def upgrade() -> None:
+    for attempt in range(1, ATTEMPTS + 1):
+        removed = dedupe()
+        print(f"user_activity_progress: removed {removed} duplicate rows")
+        try:
+            create_index(NAME, 'user_activity_progress', ['user_id', 'activity_id'], unique=True)
+            break
+        except sa.exc.IntegrityError:
+            if attempt == ATTEMPTS:
+                raise
+    if dialect() == 'postgresql':
+        # Promote the index to a constraint so it matches models.py; instant once the index exists
+        if NAME not in {uc['name'] for uc in sa.inspect(op.get_bind()).get_unique_constraints('user_activity_progress')}:
+            op.execute(f"ALTER TABLE user_activity_progress ADD CONSTRAINT {NAME} UNIQUE USING INDEX {NAME}")
+
+def downgrade() -> None:
+    if NAME not in index_columns('user_activity_progress'):
+        return
+    if dialect() == 'postgresql':
+        op.drop_constraint(NAME, 'user_activity_progress', type_='unique')
+    elif dialect() == 'sqlite' and NAME not in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('user_activity_progress')}:
+        # Declared in the CREATE TABLE by create_all(); only a table rebuild removes it
+        with op.batch_alter_table('user_activity_progress') as batch:
+            batch.drop_constraint(NAME, type_='unique')
+    else:
+        drop_index(NAME, 'user_activity_progress')
@@ -0,0 +1,42 @@
+"""score_events.folded_at: keep folded events instead of deleting them
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 10:30:00.000000
+
+The aggregator claims a batch by stamping folded_at on its events in the
+same transaction as the score upserts, so score_events keeps the full
+history and pending events are the rows with no folded_at.
+
+- folded_at: nullable, so adding it only touches the catalog
+- (folded_at, id): the aggregator's backlog in id order, and its count
+- (user_id, folded_at, id): a user's pending events; replaces (user_id, id)
+
+Every existing row starts out pending. Events an earlier, watermark-based
+aggregator already folded are marked by score_events.retire_watermark(),
+which the app runs at startup before the aggregator's first pass.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_ddl import add_column, create_index, drop_column, drop_index
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    add_column('score_events', sa.Column('folded_at', sa.DateTime(), nullable=True))
+    create_index('ix_score_events_folded', 'score_events', ['folded_at', 'id'])
+    create_index('ix_score_events_user_folded', 'score_events', ['user_id', 'folded_at', 'id'])
+    drop_index('ix_score_events_user', 'score_events')
+
+def downgrade() -> None:
+    # Before 005 every row in score_events is pending, so folded history has to go
+    op.execute("DELETE FROM score_events WHERE folded_at IS NOT NULL")
+    create_index('ix_score_events_user', 'score_events', ['user_id', 'id'])
+    drop_index('ix_score_events_user_folded', 'score_events')
+    drop_index('ix_score_events_folded', 'score_events')
+    drop_column('score_events', 'folded_at')
@@ -0,0 +1,75 @@
+# async_crud.py - AsyncSession variants of the crud functions used by async def endpoints
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Module, StudentScore, UserModuleProgress
+
+# ==================== MODULE ====================
+
+async def get_module(db: AsyncSession, module_id: int) -> Optional[Module]:
+    """Get module by ID"""
+    return await db.get(Module, module_id)
+
+async def get_next_module(db: AsyncSession, module: Module) -> Optional[Module]:
+    """Get the module after this one in the same course"""
+    result = await db.execute(
+        select(Module)
+        .where(Module.course_id == module.course_id, Module.id > module.id)
+        .order_by(Module.id)
+        .limit(1)
+    )
+    return result.scalars().first()
+
+# ==================== PROGRESS ====================
+
+async def get_user_module_progress(db: AsyncSession, user_id: int, module_id: int) -> Optional[UserModuleProgress]:
+    """Get a user's progress row for a module"""
+    result = await db.execute(
+        select(UserModuleProgress).where(
+            UserModuleProgress.user_id == user_id,
+            UserModuleProgress.module_id == module_id
+        )
+    )
+    return result.scalars().first()
+
+async def get_or_create_module_progress(db: AsyncSession, user_id: int, module_id: int) -> UserModuleProgress:
+    """Get a user's progress row for a module, adding an unlocked one if missing (not committed)"""
+    progress = await get_user_module_progress(db, user_id, module_id)
+    if not progress:
+        progress = UserModuleProgress(
+            user_id=user_id,
+            module_id=module_id,
+            locked=False,
+            completed=False,
+            last_accessed=datetime.utcnow()
+        )
+        db.add(progress)
+    return progress
+
+async def unlock_next_module(db: AsyncSession, module: Module, user_id: int) -> Optional[Module]:
+    """Unlock the module after this one for the user (not committed)"""
+    next_module = await get_next_module(db, module)
+    if next_module:
+        next_progress = await get_or_create_module_progress(db, user_id, next_module.id)
+        next_progress.locked = False
+    return next_module
+
+# ==================== SCORES ====================
+
+async def get_student_scores(db: AsyncSession, user_id: int) -> List[StudentScore]:
+    """Get all scores for a student"""
+    result = await db.execute(select(StudentScore).where(StudentScore.user_id == user_id))
+    return result.scalars().all()
+
+async def get_module_scores(db: AsyncSession, module_id: int) -> List[StudentScore]:
+    """Get all student scores for a module, highest first"""
+    result = await db.execute(
+        select(StudentScore)
+        .where(StudentScore.module_id == module_id)
+        .order_by(StudentScore.total_score.desc())
+    )
+    return result.scalars().all()
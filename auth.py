@@ -1,5 +1,11 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 
 SECRET_KEY = "RAJALAKSHMICOLLEGE"  # 🔐 Use a secure value in production
 ALGORITHM = "HS256"
@@ -16,3 +22,111 @@ def verify_token(token: str):
         return payload
     except JWTError:
         return None
+
+
+# ==================== VERIFIED PRINCIPAL CACHE ====================
+
+@dataclass(frozen=True)
+class Principal:
+    """Detached, read-only snapshot of an authenticated user"""
+    id: int
+    email: str
+    is_admin: bool = False
+
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of verified tokens -> Principal.
+
+    Keys are SHA-256 digests of the raw token so the cache never holds
+    bearer credentials. Entries never outlive the token's own ``exp``.
+    The cache is per process; user edits call ``invalidate_user`` and the
+    TTL bounds staleness across workers.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # digest -> (expires_at, Principal)
+        self._by_user = {}  # user_id -> set of digests
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str):
+        key = self.digest(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, principal = entry
+            if expires_at <= now:
+                self._discard(key, principal.id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: float = None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        key = self.digest(token)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._discard(key, old[1].id)
+            self._entries[key] = (time.monotonic() + ttl, principal)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, (_, old_principal) = self._entries.popitem(last=False)
+                self._discard(old_key, old_principal.id)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token belonging to ``user_id``"""
+        with self._lock:
+            for key in self._by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+    def _discard(self, key: str, user_id: int):
+        # Caller must hold self._lock
+        self._entries.pop(key, None)
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "300")),
+)
@@ -0,0 +1,2 @@
+# benchmarks - standalone performance scripts; run each with `python -m benchmarks.<name>`
+# (dataset.py is the synthetic school the load and query plan scripts seed)
@@ -0,0 +1,135 @@
+# dataset.py - synthetic school shared by the benchmarks: catalog, students, progress, scores and uploads
+#
+# Ids are assigned from 1 in a fixed order, so scripts compute which
+# modules belong to a course or which activities a module has instead of
+# querying for them.
+
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import insert
+
+from database import Base
+from models import (PDF, Activity, Course, Module, Resource, ScoreEvent, StudentScore, UploadedFile,
+                    User, UserActivityProgress, UserModuleProgress, UserTotalScore, Video, activity_key)
+
+SEEDED_AT = datetime(2026, 1, 1)
+
+
+def create_schema(engine):
+    """A fresh schema with indexes built in name order.
+
+    create_all() builds a table's indexes in set order, and SQLite breaks
+    ties between equally good indexes by creation order, so plans would
+    change from run to run.
+    """
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                index.drop(conn)
+                index.create(conn)
+
+
+class Dataset:
+    """Courses of modules of resources, each resource with a video, a PDF and some activities.
+
+    Every student has progress on the first three modules, has completed
+    the first ten activities, holds scores in the first two modules and
+    has one score event waiting for the aggregator.
+    """
+
+    def __init__(self, students: int = 300, courses: int = 3, modules_per_course: int = 5,
+                 resources_per_module: int = 4, activities_per_resource: int = 5, uploads: int = 200):
+        self.students = students
+        self.courses = courses
+        self.modules_per_course = modules_per_course
+        self.resources_per_module = resources_per_module
+        self.activities_per_resource = activities_per_resource
+        self.uploads = uploads
+
+    @property
+    def modules(self) -> int:
+        return self.courses * self.modules_per_course
+
+    @property
+    def resources(self) -> int:
+        return self.modules * self.resources_per_module
+
+    @property
+    def activities(self) -> int:
+        return self.resources * self.activities_per_resource
+
+    def student_email(self, user_id: int) -> str:
+        return f"student{user_id}@example.com"
+
+    def activity_name(self, activity_id: int) -> str:
+        return f"Activity {activity_id}"
+
+    def course_modules(self, course_id: int) -> List[int]:
+        first = (course_id - 1) * self.modules_per_course + 1
+        return list(range(first, first + self.modules_per_course))
+
+    def module_activities(self, module_id: int) -> List[int]:
+        per_module = self.resources_per_module * self.activities_per_resource
+        first = (module_id - 1) * per_module + 1
+        return list(range(first, first + per_module))
+
+    def seed(self, db, password_hash: str = "x"):
+        """Insert everything with bulk INSERTs and commit; students are ids 1..students"""
+        now = SEEDED_AT
+        db.execute(insert(Course), [
+            {"id": c, "name": f"Course {c}", "description": "", "background_image": ""}
+            for c in range(1, self.courses + 1)
+        ])
+        db.execute(insert(Module), [
+            {"id": m, "name": f"Module {m}", "description": "", "background_image": "",
+             "course_id": (m - 1) // self.modules_per_course + 1, "score": 10}
+            for m in range(1, self.modules + 1)
+        ])
+        db.execute(insert(Resource), [
+            {"id": r, "name": f"Resource {r}", "module_id": (r - 1) // self.resources_per_module + 1}
+            for r in range(1, self.resources + 1)
+        ])
+        db.execute(insert(Video), [
+            {"title": f"Video {r}", "url": f"videos/{r}.mp4", "resource_id": r} for r in range(1, self.resources + 1)
+        ])
+        db.execute(insert(PDF), [
+            {"title": f"PDF {r}", "url": f"pdf/{r}.pdf", "resource_id": r} for r in range(1, self.resources + 1)
+        ])
+        db.execute(insert(Activity), [
+            {"id": a, "name": self.activity_name(a), "name_key": activity_key(self.activity_name(a)),
+             "resource_id": (a - 1) // self.activities_per_resource + 1}
+            for a in range(1, self.activities + 1)
+        ])
+
+        users = range(1, self.students + 1)
+        db.execute(insert(User), [
+            {"id": u, "email": self.student_email(u), "password": password_hash} for u in users
+        ])
+        db.execute(insert(UserModuleProgress), [
+            {"user_id": u, "module_id": m, "locked": False, "completed": m < 3, "last_accessed": now}
+            for u in users for m in range(1, min(3, self.modules) + 1)
+        ])
+        db.execute(insert(UserActivityProgress), [
+            {"user_id": u, "activity_id": a, "completed": True}
+            for u in users for a in range(1, min(10, self.activities) + 1)
+        ])
+        db.execute(insert(StudentScore), [
+            {"user_id": u, "module_id": m, "total_score": float(u % 50 + m), "completed_at": now}
+            for u in users for m in range(1, min(2, self.modules) + 1)
+        ])
+        db.execute(insert(UserTotalScore), [
+            {"user_id": u, "total_score": float(2 * (u % 50) + 3), "updated_at": now} for u in users
+        ])
+        db.execute(insert(ScoreEvent), [
+            {"user_id": u, "module_id": 1, "delta": 1.0, "created_at": now} for u in users
+        ])
+        if self.uploads:
+            db.execute(insert(UploadedFile), [
+                {"filename": f"{i:064x}.pdf", "sha256": f"{i:064x}", "original_name": f"worksheet {i}.pdf",
+                 "size": 1000 + i, "created_at": now + timedelta(minutes=i), "updated_at": now}
+                for i in range(1, self.uploads + 1)
+            ])
+        db.commit()
@@ -0,0 +1,129 @@
+# event_loop_lag.py - event-loop lag of sync vs async database sessions in async def routes
+#
+#   python -m benchmarks.event_loop_lag --requests 200 --concurrency 10
+#
+# Serves GET /modules/{id}/scores twice on a throwaway app backed by a temp
+# SQLite file: once the old way (sync Session inside async def) and once
+# through get_async_db/async_crud. A probe coroutine sleeps 5 ms in a loop
+# and records how late it wakes up while the requests are in flight.
+#
+# Keep --concurrency below the sync pool size (5 + 10 overflow): past it the
+# sync variant blocks the loop waiting for a connection that only the
+# blocked loop could release, and stalls until the pool timeout.
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import async_crud
+import crud
+from database import Base
+from models import Course, Module, StudentScore, User
+
+PROBE_INTERVAL = 0.005
+
+
+def seed(session_factory, students: int):
+    db = session_factory()
+    db.add(Course(id=1, name="Benchmark course"))
+    db.add(Module(id=1, name="Benchmark module", course_id=1, score=10))
+    db.add_all(User(id=i, email=f"student{i}@example.com", password="x") for i in range(1, students + 1))
+    db.flush()
+    db.add_all(StudentScore(user_id=i, module_id=1, total_score=i % 97) for i in range(1, students + 1))
+    db.commit()
+    db.close()
+
+
+def build_app(sync_factory, async_factory) -> FastAPI:
+    app = FastAPI()
+
+    def get_db():
+        db = sync_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_factory() as db:
+            yield db
+
+    @app.get("/sync/modules/{module_id}/scores")
+    async def sync_scores(module_id: int, db=Depends(get_db)):
+        return len(crud.get_module_scores(db, module_id))
+
+    @app.get("/async/modules/{module_id}/scores")
+    async def async_scores(module_id: int, db=Depends(get_async_db)):
+        return len(await async_crud.get_module_scores(db, module_id))
+
+    return app
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+async def run(app: FastAPI, path: str, requests: int, concurrency: int) -> dict:
+    lags, stop = [], asyncio.Event()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        probe_task = asyncio.create_task(probe(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    lags.sort()
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "lag_p50_ms": round(statistics.median(lags), 2),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1], 2),
+        "lag_max_ms": round(lags[-1], 2),
+    }
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        Base.metadata.create_all(sync_engine)
+        sync_factory = sessionmaker(bind=sync_engine, autoflush=False)
+        async_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        seed(sync_factory, args.students)
+
+        app = build_app(sync_factory, async_factory)
+        for label in ("sync", "async"):
+            result = await run(app, f"/{label}/modules/1/scores", args.requests, args.concurrency)
+            print(f"{label:>5} session: {result}")
+
+        await async_engine.dispose()
+        sync_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-loop lag: sync vs async sessions in async def routes")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--students", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,342 @@
+# load.py - student sessions against the real app: throughput, latency percentiles and queries per endpoint
+#
+#   python -m benchmarks.load --sessions 300 --concurrency 20
+#   python -m benchmarks.load --server uvicorn --output load.json
+#   python -m benchmarks.load --output load.json --baseline ci/load-baseline.json
+#
+# Seeds a benchmarks.dataset school into a fresh database (a temp SQLite
+# file unless --database-url is given). Then runs --sessions student
+# sessions, --concurrency at a time, against main.app:
+#   login -> /courses -> /courses/{id}/modules -> /modules/{id}/resources
+#   -> --completions activity completions -> /leaderboard -> /score
+# Courses, modules and activities are picked from a per-session random
+# seed, so a run replays the same sessions whatever the scheduling.
+#
+# --server inprocess (default) calls the ASGI app directly through httpx.
+# --server uvicorn serves it from a local uvicorn on a free port, in a
+# thread of this process, and measures over real HTTP. Either way the
+# app's startup hooks and background loops run as in production, and
+# statements are counted per request on the app's engines.
+#
+# Prints a table per endpoint: requests, errors (4xx/5xx, e.g. 503s from
+# the hashing pool when logins outrun HASH_MAX_QUEUE), requests/s,
+# p50/p95/p99 and mean latency in ms, and DB queries per request. --output
+# writes the same numbers as JSON. --baseline compares this run with an
+# earlier --output file and exits 1 if an endpoint now runs more queries
+# per request, fails more often, or has a p95 more than
+# --latency-tolerance slower. Record the baseline on the machine that
+# runs the comparison; latencies from another machine mean nothing.
+#
+# The database is created from scratch, so only point --database-url at a
+# scratch database.
+
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+PASSWORD = "secret"
+# Login is part of every session; keep bcrypt cheap so it does not drown out the rest
+BENCH_BCRYPT_ROUNDS = "4"
+# Timed cache refreshes (catalog version poll, auth cache expiry) add fractions
+# of a query per request from run to run; more than this is a regression
+QUERY_TOLERANCE = 0.1
+
+
+# ==================== QUERY COUNTING ====================
+
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+class QueryCounter:
+    """ASGI wrapper that counts statements per request and files them under the matched route.
+
+    The count lives in a context variable set for the request, which
+    follows it onto the threadpool (sync endpoints) and into async
+    sessions; background loops run outside any request and are not
+    counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self.queries = defaultdict(lambda: [0, 0])  # "GET /route/{param}" -> [requests, statements]
+
+    def listen(self, engine):
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._statement)
+
+    def _statement(self, *args):
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        counter = [0]
+        token = _request_queries.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            label = f"{scope['method']} {route.path if route else scope['path']}"
+            with self._lock:
+                self.queries[label][0] += 1
+                self.queries[label][1] += counter[0]
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+
+
+# ==================== SESSIONS ====================
+
+class Results:
+    """Client-side latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label: str, seconds: float, ok: bool):
+        self.latencies[label].append(seconds)
+        if not ok:
+            self.errors[label] += 1
+
+async def call(client: httpx.AsyncClient, results: Results, method: str, route: str, path_params=None, **kwargs):
+    """One request, recorded under "METHOD /route/{param}" (the app's own route path)"""
+    url = route.format(**(path_params or {}))
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    results.record(f"{method} {route}", time.perf_counter() - started, response.status_code < 400)
+    return response
+
+async def student_session(make_client, dataset, results: Results, session: int, args):
+    rng = random.Random(args.seed * 1_000_003 + session)
+    user_id = rng.randint(1, dataset.students)
+    async with make_client() as client:
+        await call(client, results, "POST", "/login",
+                   json={"email": dataset.student_email(user_id), "password": PASSWORD})
+        await call(client, results, "GET", "/courses")
+        course_id = rng.randint(1, dataset.courses)
+        await call(client, results, "GET", "/courses/{course_id}/modules", {"course_id": course_id})
+        module_id = rng.choice(dataset.course_modules(course_id))
+        await call(client, results, "GET", "/modules/{module_id}/resources", {"module_id": module_id})
+        activities = dataset.module_activities(module_id)
+        for activity_id in rng.sample(activities, min(args.completions, len(activities))):
+            await call(client, results, "POST", "/activities/{activity_name}/complete",
+                       {"activity_name": dataset.activity_name(activity_id)}, json={"score": 10})
+        await call(client, results, "GET", "/leaderboard")
+        await call(client, results, "GET", "/score")
+
+async def run_sessions(make_client, dataset, results: Results, sessions: range, args) -> float:
+    queue = asyncio.Queue()
+    for session in sessions:
+        queue.put_nowait(session)
+
+    async def worker():
+        while not queue.empty():
+            await student_session(make_client, dataset, results, queue.get_nowait(), args)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return time.perf_counter() - started
+
+
+# ==================== REPORT ====================
+
+def percentile(ordered: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def summarize(results: Results, counter: QueryCounter, elapsed: float, args, dataset) -> dict:
+    endpoints = {}
+    for label in sorted(results.latencies):
+        latencies = sorted(results.latencies[label])
+        requests, statements = counter.queries.get(label, (0, 0))
+        endpoints[label] = {
+            "requests": len(latencies),
+            "errors": results.errors[label],
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "queries_per_request": round(statements / requests, 2) if requests else None,
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "config": {
+            "server": args.server,
+            "database": args.database_url.split(":", 1)[0],
+            "sessions": args.sessions,
+            "warmup_sessions": args.warmup,
+            "concurrency": args.concurrency,
+            "completions_per_session": args.completions,
+            "seed": args.seed,
+            "students": dataset.students,
+            "courses": dataset.courses,
+            "modules_per_course": dataset.modules_per_course,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "throughput_rps": round(total / elapsed, 1),
+        "endpoints": endpoints,
+    }
+
+def print_report(summary: dict):
+    print(f"{'endpoint':<42}{'reqs':>7}{'errs':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}{'queries':>9}")
+    for label, e in summary["endpoints"].items():
+        queries = "-" if e["queries_per_request"] is None else f"{e['queries_per_request']:.2f}"
+        print(f"{label:<42}{e['requests']:>7}{e['errors']:>6}{e['throughput_rps']:>9.1f}{e['p50_ms']:>9.2f}"
+              f"{e['p95_ms']:>9.2f}{e['p99_ms']:>9.2f}{e['mean_ms']:>9.2f}{queries:>9}")
+    print(f"{summary['requests']} requests, {summary['errors']} errors in {summary['elapsed_seconds']}s "
+          f"({summary['throughput_rps']} req/s)")
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions against a baseline summary, as messages"""
+    regressions = []
+    for label, before in baseline["endpoints"].items():
+        now = summary["endpoints"].get(label)
+        if now is None:
+            regressions.append(f"{label}: not exercised in this run")
+            continue
+        if before["queries_per_request"] is not None and now["queries_per_request"] is not None \
+                and now["queries_per_request"] > before["queries_per_request"] + QUERY_TOLERANCE:
+            regressions.append(f"{label}: {now['queries_per_request']} queries per request, "
+                               f"baseline {before['queries_per_request']}")
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {now['p95_ms']} ms, baseline {before['p95_ms']} ms")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{label}: {now['errors']} errors, baseline {before['errors']}")
+    return regressions
+
+
+# ==================== RUN ====================
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def drive(args) -> dict:
+    import database
+    import hashing
+    from benchmarks.dataset import Dataset, create_schema
+
+    create_schema(database.engine)
+    # No upload rows: the startup reconcile would delete them, since their files are not on disk
+    dataset = Dataset(students=args.students, courses=args.courses,
+                      modules_per_course=args.modules_per_course, uploads=0)
+    db = database.SessionLocal()
+    hashing.configure_rounds(int(BENCH_BCRYPT_ROUNDS))
+    dataset.seed(db, password_hash=hashing.pwd_context.hash(PASSWORD))
+    db.close()
+
+    import main
+    counter = QueryCounter(main.app)
+    counter.listen(database.engine)
+    counter.listen(database.async_engine.sync_engine)
+
+    if args.server == "uvicorn":
+        import uvicorn
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(counter, host="127.0.0.1", port=port,
+                                               log_level="warning", lifespan="on"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            await asyncio.sleep(0.05)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+        def make_client():
+            return httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+        lifespan = None
+    else:
+        transport = httpx.ASGITransport(app=counter)
+
+        def make_client():
+            return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+
+    try:
+        # Warm-up fills the catalog cache, the pools and the auth cache; it is not reported
+        await run_sessions(make_client, dataset, Results(), range(-args.warmup, 0), args)
+        counter.reset()
+        results = Results()
+        elapsed = await run_sessions(make_client, dataset, results, range(args.sessions), args)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        else:
+            server.should_exit = True
+            thread.join()
+    return summarize(results, counter, elapsed, args, dataset)
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        # database.py builds its engines at import, so the URL has to be set first
+        args.database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ.setdefault("BCRYPT_ROUNDS", BENCH_BCRYPT_ROUNDS)
+        # main.py mounts videos/ and pdf/ and writes uploads/ and its caches under the working directory
+        for name in ("videos", "pdf", "uploads"):
+            os.makedirs(os.path.join(tmp, name))
+        os.environ.setdefault("SPELL_INDEX_PATH", os.path.join(tmp, "spell_index.json"))
+        os.environ.setdefault("TRANSLATION_MEMORY_PATH", os.path.join(tmp, "translation_memory.sqlite3"))
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            summary = asyncio.run(drive(args))
+        finally:
+            os.chdir(cwd)
+
+    print_report(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.latency_tolerance)
+        for message in regressions:
+            print("regression:", message)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the student hot paths")
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--sessions", type=int, default=200, help="measured student sessions")
+    parser.add_argument("--warmup", type=int, default=20, help="sessions run first and not reported")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions in flight at once")
+    parser.add_argument("--completions", type=int, default=3, help="activity completions per session")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--modules-per-course", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="scratch database to run against (default: temp SQLite file)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="earlier --output file to compare with")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25,
+                        help="allowed p95 slowdown against the baseline (0.25 = 25%%)")
+    sys.exit(main(parser.parse_args()))
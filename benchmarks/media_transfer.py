@@ -0,0 +1,112 @@
+# media_transfer.py - bytes sent for typical video-seek and PDF-reopen sessions
+#
+#   python -m benchmarks.media_transfer --video-mb 50 --seeks 8 --reopens 3
+#
+# Serves one generated video and one PDF two ways on a throwaway app: the old
+# way (whole file on every request, no validators) and through media.py. The
+# player session opens the video, then seeks --seeks times, fetching a 1 MiB
+# window at each position; the worksheet session downloads the PDF once and
+# reopens it --reopens times with the validators from the first response.
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.responses import StreamingResponse
+
+from media import MediaFiles, media_response
+
+WINDOW = 1024 * 1024
+
+
+def make_file(path: str, size: int, header: bytes = b""):
+    with open(path, "wb") as f:
+        f.write(header)
+        remaining = size - len(header)
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, WINDOW))
+            f.write(chunk)
+            remaining -= len(chunk)
+
+def make_app(media_dir: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy/{filename}")
+    def legacy(filename: str):
+        # What /videos and /files used to cost: the whole body, nothing to revalidate
+        path = os.path.join(media_dir, filename)
+        def body():
+            with open(path, "rb") as f:
+                yield from iter(lambda: f.read(64 * 1024), b"")
+        return StreamingResponse(body())
+
+    @app.get("/files/{filename}")
+    def files(filename: str, request: Request):
+        return media_response(request.headers, os.path.join(media_dir, filename),
+                              immutable=True, filename=filename)
+
+    app.mount("/videos", MediaFiles(directory=media_dir), name="videos")
+    return app
+
+async def fetch(client: httpx.AsyncClient, url: str, headers: dict = None) -> httpx.Response:
+    async with client.stream("GET", url, headers=headers or {}) as response:
+        response.sent = 0
+        async for chunk in response.aiter_raw():
+            response.sent += len(chunk)
+    return response
+
+async def video_session(client, url: str, size: int, seeks: int, ranged: bool) -> dict:
+    rng = random.Random(1)
+    offsets = [0] + [rng.randrange(0, size - WINDOW) for _ in range(seeks)]
+    sent, statuses = 0, []
+    for offset in offsets:
+        headers = {"Range": f"bytes={offset}-{offset + WINDOW - 1}"} if ranged else {}
+        response = await fetch(client, url, headers)
+        sent += response.sent
+        statuses.append(response.status_code)
+    return {"requests": len(offsets), "bytes": sent, "statuses": sorted(set(statuses))}
+
+async def pdf_session(client, url: str, reopens: int, conditional: bool) -> dict:
+    response = await fetch(client, url)
+    sent, statuses = response.sent, [response.status_code]
+    validators = {}
+    if conditional and "etag" in response.headers:
+        validators["If-None-Match"] = response.headers["etag"]
+    for _ in range(reopens):
+        response = await fetch(client, url, validators)
+        sent += response.sent
+        statuses.append(response.status_code)
+    return {"requests": reopens + 1, "bytes": sent, "statuses": sorted(set(statuses))}
+
+async def run(video_mb: int, pdf_mb: int, seeks: int, reopens: int):
+    with tempfile.TemporaryDirectory() as media_dir:
+        video_size = video_mb * 1024 * 1024
+        make_file(os.path.join(media_dir, "lesson.mp4"), video_size)
+        make_file(os.path.join(media_dir, "worksheet.pdf"), pdf_mb * 1024 * 1024, b"%PDF-1.4\n")
+
+        transport = httpx.ASGITransport(app=make_app(media_dir))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = {
+                "video seek (legacy)": await video_session(client, "/legacy/lesson.mp4", video_size, seeks, ranged=False),
+                "video seek (media)": await video_session(client, "/videos/lesson.mp4", video_size, seeks, ranged=True),
+                "pdf reopen (legacy)": await pdf_session(client, "/legacy/worksheet.pdf", reopens, conditional=False),
+                "pdf reopen (media)": await pdf_session(client, "/files/worksheet.pdf", reopens, conditional=True),
+            }
+
+    print(f"{'session':<22}{'requests':>10}{'MiB sent':>12}  statuses")
+    for name, result in results.items():
+        print(f"{name:<22}{result['requests']:>10}{result['bytes'] / WINDOW:>12.2f}  {result['statuses']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes sent for video-seek and PDF-reopen sessions")
+    parser.add_argument("--video-mb", type=int, default=50)
+    parser.add_argument("--pdf-mb", type=int, default=5)
+    parser.add_argument("--seeks", type=int, default=8)
+    parser.add_argument("--reopens", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.video_mb, args.pdf_mb, args.seeks, args.reopens))
@@ -0,0 +1,154 @@
+# progress_commits.py - statements and commits per module-completion request, before and after progress.py
+#
+#   python -m benchmarks.progress_commits --students 200
+#
+# Every student completes module 1 of a three-module course through each of
+# the three endpoints' code paths on a temp SQLite file: the old sequences
+# (crud.update_module + crud.unlock_next_content for /complete, the
+# async_crud steps for /user-progress and /complete-progress) and
+# progress.apply_module_progress. Each student's first call and a repeat
+# call are measured separately, since the first one creates progress rows.
+#
+# The old /complete-progress also called calculate_and_save_student_score,
+# which failed on columns Activity does not have; its old numbers stop
+# before that step.
+
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import async_crud
+import crud
+import progress
+from database import Base
+from models import Course, Module, StudentScore, User
+
+
+class Counter:
+    """Statements and commits seen by one engine"""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def seed(session_factory, students: int):
+    db = session_factory()
+    db.add(Course(id=1, name="Benchmark course"))
+    db.add_all(Module(id=i, name=f"Module {i}", course_id=1, score=10) for i in range(1, 4))
+    db.add_all(User(id=i, email=f"student{i}@example.com", password="x") for i in range(1, students + 1))
+    db.commit()
+    db.close()
+
+
+# ==================== OLD CODE PATHS ====================
+
+def old_complete(db, user_id: int, module_id: int):
+    crud.update_module(db, module_id, completed=True, user_id=user_id)
+    crud.unlock_next_content(db, module_id, user_id=user_id)
+    db.execute(select(StudentScore).where(StudentScore.user_id == user_id,
+                                          StudentScore.module_id == module_id)).scalars().first()
+
+async def old_user_progress(db, user_id: int, module_id: int):
+    db_module = await async_crud.get_module(db, module_id)
+    user_progress = await async_crud.get_or_create_module_progress(db, user_id, module_id)
+    user_progress.completed = True
+    if user_progress.completed:
+        await async_crud.unlock_next_module(db, db_module, user_id)
+    await db.commit()
+
+
+# ==================== RUN ====================
+
+async def measure(label: str, students: range, call, counter: Counter, results: dict):
+    for attempt in ("first", "repeat"):
+        counter.reset()
+        started = time.perf_counter()
+        for user_id in students:
+            await call(user_id)
+        elapsed = time.perf_counter() - started
+        results[(label, attempt)] = (
+            counter.statements / len(students),
+            counter.commits / len(students),
+            elapsed / len(students) * 1000,
+        )
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        Base.metadata.create_all(sync_engine)
+        sync_factory = sessionmaker(bind=sync_engine, autoflush=False)
+        async_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        seed(sync_factory, args.students * 5)
+        sync_counter = Counter(sync_engine)
+        async_counter = Counter(async_engine.sync_engine)
+
+        # A separate group of students per variant so every "first" call starts from no rows
+        groups = [range(i * args.students + 1, (i + 1) * args.students + 1) for i in range(5)]
+
+        def sync_call(fn):
+            async def call(user_id):
+                db = sync_factory()
+                try:
+                    fn(db, user_id, 1)
+                finally:
+                    db.close()
+            return call
+
+        def async_call(fn):
+            async def call(user_id):
+                async with async_factory() as db:
+                    await fn(db, user_id, 1)
+            return call
+
+        def engine_call(*options):
+            async def call(db, user_id, module_id):
+                await db.run_sync(progress.apply_module_progress, user_id, module_id, True, *options)
+            return async_call(call)
+
+        results = {}
+        # crud.unlock_next_content prints on every call; keep the table readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await measure("/complete (old)", groups[0], sync_call(old_complete), sync_counter, results)
+            await measure("/complete (engine)", groups[1],
+                          sync_call(lambda db, u, m: progress.apply_module_progress(db, u, m, True, progress.SCORE_AWARD)),
+                          sync_counter, results)
+            await measure("/user-progress (old)", groups[2], async_call(old_user_progress), async_counter, results)
+            await measure("/user-progress (engine)", groups[3], engine_call(), async_counter, results)
+            await measure("/complete-progress (engine)", groups[4], engine_call(progress.SCORE_REPORT),
+                          async_counter, results)
+
+        print(f"{'code path':<30}{'call':>8}{'statements':>12}{'commits':>9}{'ms':>8}")
+        for (label, attempt), (statements, commits, ms) in results.items():
+            print(f"{label:<30}{attempt:>8}{statements:>12.1f}{commits:>9.1f}{ms:>8.2f}")
+        print("/complete-progress (old) matched /user-progress (old) up to its failing score step")
+
+        await async_engine.dispose()
+        sync_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statements and commits per module-completion request")
+    parser.add_argument("--students", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,158 @@
+# score_events.py - score write throughput and aggregation lag: direct upserts vs the write-behind log
+#
+#   python -m benchmarks.score_events --threads 16 --submissions 200 --students 30
+#
+# A class of --students finishes the same module: --threads workers submit
+# --submissions score changes each for random students, one transaction
+# per submission. The first run upserts student_scores and
+# user_total_scores directly (crud.add_score); the second appends to
+# score_events while a background thread runs the aggregator every
+# --interval seconds. A sampler records the age of the oldest pending
+# event throughout; after the writers stop it times how long the backlog
+# takes to drain, then checks that both tables hold exactly the submitted
+# points.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import score_events
+from database import Base
+from models import Course, Module, ScoreEvent, StudentScore, User, UserTotalScore
+
+POINTS = 10
+MODULE_ID = 1
+
+
+def reset(session_factory, students: int):
+    db = session_factory()
+    for model in (ScoreEvent, StudentScore, UserTotalScore):
+        db.query(model).delete()
+    if db.get(Course, 1) is None:
+        db.add(Course(id=1, name="Benchmark course"))
+        db.add(Module(id=MODULE_ID, name="Benchmark module", course_id=1, score=POINTS))
+    existing = {user_id for (user_id,) in db.query(User.id)}
+    db.add_all(User(id=i, email=f"student{i}@example.com", password="x")
+               for i in range(1, students + 1) if i not in existing)
+    db.commit()
+    db.close()
+
+def submit_all(session_factory, submit, threads: int, submissions: int, students: int) -> float:
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(submissions):
+            db = session_factory()
+            try:
+                submit(db, rng.randint(1, students))
+                db.commit()
+            finally:
+                db.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return threads * submissions / (time.perf_counter() - started)
+
+def direct(db, user_id):
+    crud.add_score(db, user_id, MODULE_ID, POINTS)
+
+def write_behind(db, user_id):
+    score_events.record(db, user_id, {MODULE_ID: POINTS})
+
+def pending_lag(session_factory) -> tuple:
+    db = session_factory()
+    try:
+        stats = score_events.aggregator.stats(db)
+        return stats["pending_events"], stats["lag_seconds"]
+    finally:
+        db.close()
+
+def totals(session_factory) -> tuple:
+    db = session_factory()
+    try:
+        return (db.query(func.coalesce(func.sum(StudentScore.total_score), 0)).scalar(),
+                db.query(func.coalesce(func.sum(UserTotalScore.total_score), 0)).scalar())
+    finally:
+        db.close()
+
+
+def main(args) -> int:
+    expected = args.threads * args.submissions * POINTS
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        connect_args = {"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+        engine = create_engine(url, connect_args=connect_args, pool_size=args.threads + 2, max_overflow=0)
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        score_events.aggregator = score_events.Aggregator()
+
+        reset(session_factory, args.students)
+        direct_rate = submit_all(session_factory, direct, args.threads, args.submissions, args.students)
+        direct_totals = totals(session_factory)
+
+        reset(session_factory, args.students)
+        stop = threading.Event()
+        lags = []
+
+        def aggregate_loop():
+            while not stop.is_set():
+                db = session_factory()
+                try:
+                    score_events.aggregator.drain(db)
+                finally:
+                    db.close()
+                stop.wait(args.interval)
+
+        def sample_loop():
+            while not stop.is_set():
+                lags.append(pending_lag(session_factory)[1])
+                stop.wait(0.05)
+
+        background = [threading.Thread(target=aggregate_loop), threading.Thread(target=sample_loop)]
+        for thread in background:
+            thread.start()
+        event_rate = submit_all(session_factory, write_behind, args.threads, args.submissions, args.students)
+        writers_done = time.perf_counter()
+        while pending_lag(session_factory)[0]:
+            time.sleep(0.01)
+        drain_seconds = time.perf_counter() - writers_done
+        stop.set()
+        for thread in background:
+            thread.join()
+        event_totals = totals(session_factory)
+        engine.dispose()
+
+    print(f"{'':>14}{'submits/s':>12}{'student_scores':>16}{'user_totals':>13}")
+    print(f"{'direct upsert':>14}{direct_rate:>12.1f}{direct_totals[0]:>16.0f}{direct_totals[1]:>13.0f}")
+    print(f"{'write-behind':>14}{event_rate:>12.1f}{event_totals[0]:>16.0f}{event_totals[1]:>13.0f}")
+    lags.sort()
+    print(f"expected total {expected}; aggregator every {args.interval}s")
+    if lags:
+        print(f"lag p50 {statistics.median(lags):.3f}s  p99 {lags[int(len(lags) * 0.99) - 1]:.3f}s  "
+              f"max {lags[-1]:.3f}s  drain after writers stopped {drain_seconds:.3f}s")
+    stats = score_events.aggregator
+    print(f"aggregator passes {stats.passes}, events folded {stats.events}")
+    if event_totals != (expected, expected) or direct_totals != (expected, expected):
+        print("totals are wrong")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score write throughput and aggregation lag")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=score_events.SCORE_AGGREGATE_SECONDS)
+    parser.add_argument("--database-url", help="scratch database to run against (default: temp SQLite file)")
+    sys.exit(main(parser.parse_args()))
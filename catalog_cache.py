@@ -0,0 +1,267 @@
+# catalog_cache.py - versioned response cache for course content that only admins change
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import PDF, Activity, Course, Module, Resource, TableCounter, Video, activity_key
+
+CATALOG_MODELS = (Course, Module, Resource, Video, PDF, Activity)
+CATALOG_VERSION_COUNTER = "catalog_version"
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+# How long a worker trusts its copy of the version before re-reading it.
+# Writes made through this worker are seen at once; other workers' writes
+# show up within this window.
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", "2"))
+
+
+class CatalogVersion:
+    """Process-local copy of the shared catalog version in table_counters"""
+
+    def __init__(self, poll_seconds: float = CATALOG_VERSION_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.value: Optional[int] = None
+        self.checked_at = 0.0
+        self.reads = 0
+
+    def invalidate(self):
+        self.checked_at = 0.0
+
+    def current(self, db: Session) -> int:
+        if self.value is not None and time.monotonic() - self.checked_at < self.poll_seconds:
+            return self.value
+        counter = db.get(TableCounter, CATALOG_VERSION_COUNTER, populate_existing=True)
+        if counter is None:
+            ensure_version_row(db)
+            counter = db.get(TableCounter, CATALOG_VERSION_COUNTER)
+        self.value = counter.value
+        self.checked_at = time.monotonic()
+        self.reads += 1
+        return self.value
+
+version = CatalogVersion()
+
+
+def ensure_version_row(db: Session):
+    """Create the catalog_version counter row if this database does not have one yet"""
+    if db.get(TableCounter, CATALOG_VERSION_COUNTER) is None:
+        db.add(TableCounter(name=CATALOG_VERSION_COUNTER, value=0, updated_at=datetime.utcnow()))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+
+# ==================== WRITE-THROUGH INVALIDATION ====================
+
+def _touches_catalog(session: Session) -> bool:
+    for obj in session.new | session.deleted:
+        if isinstance(obj, CATALOG_MODELS):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, CATALOG_MODELS) and session.is_modified(obj):
+            return True
+    return False
+
+@event.listens_for(Session, "before_flush")
+def _mark_catalog_write(session, flush_context, instances):
+    if _touches_catalog(session):
+        session.info["catalog_write"] = True
+
+@event.listens_for(Session, "after_flush")
+def _bump_catalog_version(session, flush_context):
+    """Bump the shared version in the same transaction as the catalog write.
+
+    Hooked on every Session, so crud.py, the REST admin endpoints and the
+    sqladmin views all invalidate the cache without calling anything.
+    """
+    if session.info.get("catalog_write") and not session.info.get("catalog_version_bumped"):
+        session.connection().execute(
+            update(TableCounter)
+            .where(TableCounter.name == CATALOG_VERSION_COUNTER)
+            .values(value=TableCounter.value + 1, updated_at=datetime.utcnow())
+        )
+        session.info["catalog_version_bumped"] = True
+
+@event.listens_for(Session, "after_commit")
+def _catalog_committed(session):
+    if session.info.pop("catalog_write", False):
+        session.info.pop("catalog_version_bumped", None)
+        version.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _catalog_rolled_back(session):
+    session.info.pop("catalog_write", None)
+    session.info.pop("catalog_version_bumped", None)
+
+
+# ==================== RESPONSE CACHE ====================
+
+class CatalogCache:
+    """Serialized JSON bodies keyed by (route, params), valid for one catalog version"""
+
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple, catalog_version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != catalog_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, catalog_version: int, body: bytes):
+        with self._lock:
+            self._entries[key] = (catalog_version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "catalog_version": version.value,
+                "version_reads": version.reads,
+            }
+
+cache = CatalogCache()
+
+_adapters = {}
+
+def _adapter(response_model) -> TypeAdapter:
+    if response_model not in _adapters:
+        _adapters[response_model] = TypeAdapter(response_model)
+    return _adapters[response_model]
+
+def catalog_etag(key: tuple, catalog_version: int) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    return f'"catalog-{catalog_version}-{digest}"'
+
+def cached_response(request: Request, db: Session, response_model, key: tuple,
+                    load: Callable[[], Any], exclude_unset: bool = False) -> Response:
+    """Answer a catalog read from the cache, with an ETag tied to the catalog version.
+
+    ``load`` runs only on a miss; its result is validated against
+    ``response_model`` (as FastAPI would) and stored as JSON bytes. A
+    matching If-None-Match gets a 304 without loading or serializing.
+    Raise HTTPException from ``load`` for 404s; those are not cached.
+    """
+    catalog_version = version.current(db)
+    etag = catalog_etag(key, catalog_version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    body = cache.get(key, catalog_version)
+    if body is None:
+        adapter = _adapter(response_model)
+        body = adapter.dump_json(adapter.validate_python(load(), from_attributes=True),
+                                 exclude_unset=exclude_unset)
+        cache.put(key, catalog_version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ==================== ACTIVITY NAMES ====================
+
+ActivityRef = namedtuple("ActivityRef", "activity_id resource_id module_id")
+
+class ActivityIndex:
+    """activity_key(name) -> ActivityRef for every activity, rebuilt when the catalog version moves.
+
+    Activity and resource edits bump the catalog version, so completions
+    resolve names and modules from memory. A name shared by several
+    activities resolves to the lowest id, like the old first-match query.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, ActivityRef] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _query(self):
+        return (
+            select(Activity.name_key, Activity.id, Activity.resource_id, Resource.module_id)
+            .join(Resource, Activity.resource_id == Resource.id)
+            .order_by(Activity.id)
+        )
+
+    def _current(self, db: Session) -> Dict[str, ActivityRef]:
+        catalog_version = version.current(db)
+        if catalog_version != self._version:
+            with self._lock:
+                if catalog_version != self._version:
+                    refs = {}
+                    for row in db.execute(self._query()):
+                        refs.setdefault(row.name_key, ActivityRef(row.id, row.resource_id, row.module_id))
+                    self._refs = refs
+                    self._version = catalog_version
+                    self.loads += 1
+        return self._refs
+
+    def warm(self, db: Session):
+        self._current(db)
+
+    def resolve_many(self, db: Session, names: Iterable[str]) -> Dict[str, ActivityRef]:
+        """activity_key(name) -> ActivityRef for the names that exist"""
+        refs = self._current(db)
+        keys = {activity_key(name) for name in names}
+        found, missing = {}, []
+        for key in keys:
+            if key in refs:
+                found[key] = refs[key]
+            else:
+                missing.append(key)
+        if missing:
+            # Possibly added by another worker since this one last polled the
+            # version; one indexed lookup before calling them unknown
+            for row in db.execute(self._query().where(Activity.name_key.in_(missing))):
+                if row.name_key not in found:
+                    found[row.name_key] = refs[row.name_key] = ActivityRef(row.id, row.resource_id, row.module_id)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return found
+
+    def resolve(self, db: Session, name: str) -> Optional[ActivityRef]:
+        return self.resolve_many(db, [name]).get(activity_key(name))
+
+    def stats(self) -> dict:
+        return {
+            "activities": len(self._refs),
+            "loads": self.loads,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+activities = ActivityIndex()
@@ -1,17 +1,21 @@
 # crud.py - Comprehensive CRUD operations for the learning management system
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from sqlalchemy.orm import joinedload, Session
+import base64
+import json
 
-from models import Course, StudentScore, Activity, Resource, Module, User, UserCourseProgress, UserModuleProgress,Video,UserActivityProgress
-from passlib.context import CryptContext
-from typing import Optional, List
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, event, func, update, insert, delete, select, cast, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, defaultload, Session
+
+from models import Course, StudentScore, Activity, Resource, Module, User, UserCourseProgress, UserModuleProgress,Video,UserActivityProgress, PDF, TableCounter, UserTotalScore, UploadedFile, activity_key
+from auth import principal_cache
+from hashing import pwd_context
+import catalog_cache  # registers the catalog version bump on every Session
+from typing import Callable, Optional, List
 from datetime import datetime
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -20,9 +24,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 # ==================== USER CRUD ====================
 
-def create_user(db: Session, email: str, password: str, is_admin: bool = False) -> User:
-    """Create a new user"""
-    hashed_password = hash_password(password)
+def create_user(db: Session, email: str, password: str, is_admin: bool = False,
+                password_hash: str = None) -> User:
+    """Create a new user (pass password_hash to skip hashing here)"""
+    hashed_password = password_hash or hash_password(password)
     db_user = User(email=email, password=hashed_password, is_admin=is_admin)
     db.add(db_user)
     db.commit()
@@ -53,14 +58,21 @@ def update_user(db: Session, user_id: int, email: str = None, password: str = No
             db_user.is_admin = is_admin
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate_user(user_id)
     return db_user
 
+def set_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    """Store a re-computed hash for the same password (no cache invalidation needed)"""
+    db.query(User).filter(User.id == user_id).update({User.password: password_hash})
+    db.commit()
+
 def delete_user(db: Session, user_id: int) -> bool:
     """Delete user"""
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
         db.delete(db_user)
         db.commit()
+        principal_cache.invalidate_user(user_id)
         return True
     return False
 
@@ -139,8 +151,7 @@ def update_module(
     completed: bool = None,
     user_id: int = None  # <-- Add user_id for per-user progress
 ) -> Optional[Module]:
-    """Update module information and update user progress/score if completed"""
-    print(f"Updating module {module_id} for user {user_id} with completed={completed}")
+    """Update module information and update user progress/score if completed; one commit"""
     db_module = db.query(Module).filter(Module.id == module_id).first()
     if not db_module:
         return None
@@ -160,54 +171,20 @@ def update_module(
             UserModuleProgress.module_id == module_id
         ).first()
         if not user_progress:
-            user_progress = UserModuleProgress(
+            db.add(UserModuleProgress(
                 user_id=user_id,
                 module_id=module_id,
                 locked=False,
                 completed=completed,
-            )
-            db.add(user_progress)
-            db.commit()
-            db.refresh(user_progress)
+            ))
         else:
             user_progress.completed = completed
             user_progress.last_accessed = datetime.utcnow()
-            db.commit()
-            db.refresh(user_progress)
-        print(completed, user_progress)
-        
-        # If completed, update student_score using module.score from modules table
-        if completed == True:
-            # Fetch the score from the modules table instead of user_progress
-            module_score = db_module.score or 0.0
-            print(f"Module {module_id} completed by user {user_id} with score {module_score} (from modules table)")
-            
-            # Update or create student_score, ADDING to previous total
-            student_score = db.query(StudentScore).filter(
-                StudentScore.user_id == user_id,
-                StudentScore.module_id == module_id
-            ).first()
-            
-            if not student_score:
-                # Create new student score with module score
-                student_score = StudentScore(
-                    user_id=user_id,
-                    module_id=module_id,
-                    total_score=module_score,  # Use module score directly for new entry
-                    completed_at=datetime.utcnow()
-                )
-                print(f"Creating new student score: {student_score}")
-                db.add(student_score)
-            else:
-                # Add module score to existing total score
-                previous_total = student_score.total_score or 0.0
-                new_total = previous_total + module_score
-                student_score.total_score = new_total
-                student_score.completed_at = datetime.utcnow()
-                print(f"Updating existing student score: previous={previous_total}, module={module_score}, new_total={new_total}")
-            
-            db.commit()
-            db.refresh(student_score)
+
+        # If completed, add modules.score through the score log like every other score path
+        if completed:
+            import score_events  # score_events imports crud
+            score_events.add_score(db, user_id, module_id, db_module.score or 0.0)
 
     db.commit()
     db.refresh(db_module)
@@ -242,33 +219,50 @@ def get_resource(db: Session, resource_id: int) -> Optional[Resource]:
     return db.query(Resource).filter(Resource.id == resource_id).first()
 
 def get_full_resources_by_module(db: Session, module_id: int, user_id: int):
+    """Get a module's resources with content and the user's activity completion.
+
+    Always five queries whatever the module size: resources, then one
+    selectin load each for videos, pdfs and activities, then one IN lookup
+    of the user's completed activities.
+    """
     resources = (
         db.query(Resource)
         .filter(Resource.module_id == module_id)
+        .order_by(Resource.id)
         .options(
-            joinedload(Resource.videos),
-            joinedload(Resource.pdfs),
-            joinedload(Resource.activities)
+            selectinload(Resource.videos),
+            selectinload(Resource.pdfs),
+            selectinload(Resource.activities)
         )
         .all()
     )
 
+    activity_ids = [act.id for res in resources for act in res.activities]
+    completed_ids = set()
+    if activity_ids:
+        completed_ids = {
+            row.activity_id for row in
+            db.query(UserActivityProgress.activity_id)
+            .filter(
+                UserActivityProgress.user_id == user_id,
+                UserActivityProgress.activity_id.in_(activity_ids),
+                UserActivityProgress.completed == True
+            )
+            .all()
+        }
+
     results = []
     for res in resources:
-        activities_with_completion = []
-        for act in res.activities:
-            progress = (
-                db.query(UserActivityProgress)
-                .filter_by(activity_id=act.id, user_id=user_id)
-                .first()
-            )
-            activities_with_completion.append({
+        activities_with_completion = [
+            {
                 "id": act.id,
                 "name": act.name,
                 "resource_id": act.resource_id,
                 "module_id": res.module_id,
-                "completed": progress.completed if progress else False
-            })
+                "completed": act.id in completed_ids
+            }
+            for act in res.activities
+        ]
 
         results.append({
             "id": res.id,
@@ -327,8 +321,133 @@ def get_videos_by_resource(db: Session, resource_id: int) -> List[Video]:
     """Get all videos for a specific resource"""
     return db.query(Video).filter(Video.resource_id == resource_id).all()
 
+def get_videos(db: Session, skip: int = 0, limit: int = 100) -> List[Video]:
+    """Get all videos with pagination"""
+    return db.query(Video).order_by(Video.id).offset(skip).limit(limit).all()
+
+def get_pdfs(db: Session, skip: int = 0, limit: int = 100) -> List[PDF]:
+    """Get all PDFs with pagination"""
+    return db.query(PDF).order_by(PDF.id).offset(skip).limit(limit).all()
+
+def get_activities(db: Session, skip: int = 0, limit: int = 100) -> List[Activity]:
+    """Get all activities with pagination"""
+    return db.query(Activity).order_by(Activity.id).offset(skip).limit(limit).all()
+
+def fill_activity_name_keys(db: Session) -> int:
+    """Set name_key on activities stored without one (rows from before the
+    column existed, raw SQL imports)"""
+    rows = db.execute(select(Activity.id, Activity.name).where(Activity.name_key.is_(None))).all()
+    if rows:
+        db.execute(update(Activity), [{"id": row.id, "name_key": activity_key(row.name)} for row in rows])
+        db.commit()
+    return len(rows)
+
 # Similar updates for Activity and PDF CRUD functions...
 
+# ==================== UPLOADED FILE CRUD ====================
+
+# GET /uploads sort keys; each has an (column, id) index on uploaded_files
+UPLOAD_SORTS = {
+    "created_at": UploadedFile.created_at,
+    "name": UploadedFile.original_name,
+    "size": UploadedFile.size,
+}
+
+def get_uploaded_file(db: Session, filename: str) -> Optional[UploadedFile]:
+    """Get an upload by its public file name"""
+    return db.query(UploadedFile).filter(UploadedFile.filename == filename).first()
+
+def get_uploaded_files(db: Session, sort: str = "created_at", descending: bool = True,
+                       after: Optional[tuple] = None, limit: int = 50) -> List[UploadedFile]:
+    """One page of uploads in (sort, id) order.
+
+    ``after`` is the (sort value, id) of the last row of the previous page.
+    Seeking past it instead of using OFFSET keeps every page an index range
+    scan of ``limit`` rows, however many uploads there are.
+    """
+    column = UPLOAD_SORTS[sort]
+    query = db.query(UploadedFile)
+    if after is not None:
+        value, last_id = after
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, UploadedFile.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, UploadedFile.id > last_id)))
+    if descending:
+        query = query.order_by(column.desc(), UploadedFile.id.desc())
+    else:
+        query = query.order_by(column.asc(), UploadedFile.id.asc())
+    return query.limit(limit).all()
+
+def upload_cursor(db_file: UploadedFile, sort: str) -> str:
+    """Opaque next-page token for get_uploaded_files(after=...)"""
+    value = getattr(db_file, UPLOAD_SORTS[sort].key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, db_file.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def parse_upload_cursor(cursor: str, sort: str) -> tuple:
+    """Inverse of upload_cursor; raises ValueError for a malformed token"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if sort == "created_at":
+        value = datetime.fromisoformat(value)
+    return value, int(last_id)
+
+def create_uploaded_file(db: Session, filename: str, sha256: str, original_name: str, size: int,
+                         uploader_id: Optional[int] = None) -> UploadedFile:
+    """Record an upload name; returns the existing row if another request recorded that name first"""
+    db_file = UploadedFile(filename=filename, sha256=sha256, original_name=original_name,
+                           size=size, uploader_id=uploader_id)
+    db.add(db_file)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_uploaded_file(db, filename)
+    db.refresh(db_file)
+    return db_file
+
+def delete_uploaded_file(db: Session, db_file: UploadedFile,
+                         remove_blob: Optional[Callable[[str], None]] = None) -> bool:
+    """Delete an upload name; True when no other name still uses its blob.
+
+    remove_blob(sha256) runs before the commit, while the transaction holds
+    the lock on that hash (FOR UPDATE on MySQL, the write lock on SQLite),
+    so an upload of the same content cannot insert its row in between and
+    then find the blob gone.
+    """
+    sha256 = db_file.sha256
+    db.delete(db_file)
+    db.flush()
+    last = not (
+        db.query(UploadedFile.id).filter(UploadedFile.sha256 == sha256).with_for_update().first()
+    )
+    if last and remove_blob is not None:
+        remove_blob(sha256)
+    db.commit()
+    return last
+
+def get_uploaded_file_hashes(db: Session) -> set:
+    """Every blob hash referenced by some upload name"""
+    return {sha256 for (sha256,) in db.query(UploadedFile.sha256).distinct()}
+
+def delete_uploaded_files_by_hash(db: Session, sha256: str, created_before: Optional[datetime] = None) -> int:
+    """Drop every name pointing at a blob that no longer exists (only names created before ``created_before``)"""
+    deleted = 0
+    query = db.query(UploadedFile).filter(UploadedFile.sha256 == sha256)
+    if created_before is not None:
+        query = query.filter(UploadedFile.created_at < created_before)
+    for db_file in query.all():
+        db.delete(db_file)
+        deleted += 1
+    db.commit()
+    return deleted
+
 # Update utility functions
 def get_course_with_modules(db: Session, course_id: int) -> Optional[Course]:
     """Get course with all its modules"""
@@ -340,7 +459,79 @@ def get_module_with_resources(db: Session, module_id: int) -> Optional[Module]:
 
 def get_resource_with_content(db: Session, resource_id: int) -> Optional[Resource]:
     """Get resource with all its content (videos, PDFs, activities)"""
-    return db.query(Resource).filter(Resource.id == resource_id).first()
+    return (
+        db.query(Resource)
+        .options(
+            selectinload(Resource.videos),
+            selectinload(Resource.pdfs),
+            selectinload(Resource.activities)
+        )
+        .filter(Resource.id == resource_id)
+        .first()
+    )
+
+# ==================== COURSE TREE ====================
+
+# course -> modules -> resources -> videos/pdfs/activities
+COURSE_TREE_MAX_DEPTH = 3
+
+def course_tree_options(depth: int = COURSE_TREE_MAX_DEPTH) -> list:
+    """Loader options for a course tree: one selectin query per level"""
+    options = []
+    if depth >= 1:
+        options.append(selectinload(Course.modules))
+    if depth >= 2:
+        options.append(selectinload(Course.modules).selectinload(Module.resources))
+    if depth >= 3:
+        path = defaultload(Course.modules).defaultload(Module.resources)
+        options += [path.selectinload(content) for content in (Resource.videos, Resource.pdfs, Resource.activities)]
+    return options
+
+def get_course_tree(db: Session, course_id: int, depth: int = COURSE_TREE_MAX_DEPTH) -> Optional[dict]:
+    """Course with its modules, resources and content down to ``depth`` levels.
+
+    depth 0 is the course alone, 1 adds modules, 2 resources and 3 the
+    videos, PDFs and activities: at most 6 queries whatever the course size.
+    Levels below ``depth`` are left out of the result rather than empty.
+    """
+    course = (
+        db.query(Course)
+        .options(*course_tree_options(depth))
+        .filter(Course.id == course_id)
+        .first()
+    )
+    if not course:
+        return None
+
+    def resource_node(resource: Resource) -> dict:
+        node = {"id": resource.id, "name": resource.name, "module_id": resource.module_id}
+        if depth >= 3:
+            node["videos"] = sorted(resource.videos, key=lambda item: item.id)
+            node["pdfs"] = sorted(resource.pdfs, key=lambda item: item.id)
+            node["activities"] = sorted(resource.activities, key=lambda item: item.id)
+        return node
+
+    def module_node(module: Module) -> dict:
+        node = {
+            "id": module.id,
+            "name": module.name,
+            "description": module.description,
+            "background_image": module.background_image,
+            "course_id": module.course_id
+        }
+        if depth >= 2:
+            node["resources"] = [resource_node(r) for r in sorted(module.resources, key=lambda item: item.id)]
+        return node
+
+    tree = {
+        "id": course.id,
+        "name": course.name,
+        "description": course.description,
+        "background_image": course.background_image
+    }
+    if depth >= 1:
+        tree["modules"] = [module_node(m) for m in sorted(course.modules, key=lambda item: item.id)]
+    return tree
 
 def unlock_next_content(db: Session, current_resource_id: int):
     """Unlock next resource/module when current one is completed"""
@@ -379,9 +570,21 @@ def unlock_next_content(db: Session, current_resource_id: int):
     
     return False
 
+def default_progress(index: int) -> dict:
+    """Progress for an item with no stored row: only the first in order is unlocked.
+
+    Progress rows are only written when a user unlocks or completes
+    something, so reads fall back to this rule instead of inserting rows.
+    """
+    return {
+        "locked": index != 0,
+        "completed": False,
+        "last_accessed": None
+    }
+
 def get_modules_by_course_with_progress(db: Session, course_id: int, user_id: int) -> List[Module]:
-    """Get all modules for a course with user-specific progress"""
-    modules = db.query(Module).filter(Module.course_id == course_id).all()
+    """Get all modules for a course with user-specific progress (read only)"""
+    modules = db.query(Module).filter(Module.course_id == course_id).order_by(Module.id).all()
     
     # Get user progress for these modules
     progress_records = (
@@ -404,37 +607,20 @@ def get_modules_by_course_with_progress(db: Session, course_id: int, user_id: in
     # Attach progress to each module
     result = []
     for i, module in enumerate(modules):
-        module_dict = {
+        result.append({
             "id": module.id,
             "name": module.name,
             "description": module.description,
             "background_image": module.background_image,
             "course_id": module.course_id,
-            "user_progress": progress_dict.get(module.id, {
-                "locked": i != 0,  # First module unlocked by default
-                "completed": False,
-                "last_accessed": None
-            })
-        }
-        
-        # Create default progress if not exists
-        if module.id not in progress_dict:
-            default_progress = UserModuleProgress(
-                user_id=user_id,
-                module_id=module.id,
-                locked=i != 0,  # First module unlocked by default
-                completed=False
-            )
-            db.add(default_progress)
-            db.commit()
-        
-        result.append(module_dict)
+            "user_progress": progress_dict.get(module.id) or default_progress(i)
+        })
     
     return result
 
 def get_courses_with_progress(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[dict]:
-    """Get all courses with user-specific progress"""
-    courses = db.query(Course).all()
+    """Get all courses with user-specific progress (read only)"""
+    courses = db.query(Course).order_by(Course.id).all()
     
     # Get user progress for these courses
     progress_records = (
@@ -457,82 +643,229 @@ def get_courses_with_progress(db: Session, user_id: int, skip: int = 0, limit: i
     # Prepare response with progress
     result = []
     for i, course in enumerate(courses):
-        course_dict = {
+        result.append({
             "id": course.id,
             "name": course.name,
             "description": course.description,
             "background_image": course.background_image,
-            "user_progress": progress_dict.get(course.id, {
-                "locked": i != 0,  # First course unlocked by default
-                "completed": False,
-                "last_accessed": None
-            })
-        }
-        
-        # Create default progress if not exists
-        if course.id not in progress_dict:
-            default_progress = UserCourseProgress(
-                user_id=user_id,
-                course_id=course.id,
-                locked=i != 0,  # First course unlocked by default
-                completed=False
-            )
-            db.add(default_progress)
-            db.commit()
-        
-        result.append(course_dict)
+            "user_progress": progress_dict.get(course.id) or default_progress(i)
+        })
     
     return result
 
-def calculate_and_save_student_score(db: Session, user_id: int, module_id: int) -> StudentScore:
+def get_student_scores(db: Session, user_id: int):
     """
-    Calculate total score from completed activities in a module and save to student_scores.
+    Get all scores for a student.
     """
-    # Get all completed activities for the module
-    activities = db.query(Activity).join(Resource, Activity.resource_id == Resource.id).filter(
-        Resource.module_id == module_id,
-        Activity.completed == True,
-        Activity.score != None
-    ).all()
-
-    if not activities:
-        return None
+    return db.query(StudentScore).filter(StudentScore.user_id == user_id).all()
 
-    total_score = sum(activity.score for activity in activities)
+def get_module_scores(db: Session, module_id: int):
+    """
+    Get all student scores for a module.
+    """
+    return db.query(StudentScore).filter(StudentScore.module_id == module_id).order_by(StudentScore.total_score.desc()).all()
 
-    # Create or update student score
-    student_score = db.query(StudentScore).filter(
-        StudentScore.user_id == user_id,
-        StudentScore.module_id == module_id
-    ).first()
+# ==================== LEADERBOARD ====================
 
-    if not student_score:
-        student_score = StudentScore(
-            user_id=user_id,
-            module_id=module_id,
-            total_score=total_score,
-            completed_at=datetime.utcnow()
-        )
-        db.add(student_score)
-    else:
-        student_score.total_score = total_score
-        student_score.completed_at = datetime.utcnow()
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE ... RETURNING
+_ON_CONFLICT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
 
-    db.commit()
-    db.refresh(student_score)
-    return student_score
+def _increment_rows_locked(db: Session, model, keys: list, column: str, rows: list) -> list:
+    """Portable _increment_rows for dialects without an upsert: lock, then update or insert each row.
 
-def get_student_scores(db: Session, user_id: int):
+    SELECT ... FOR UPDATE holds an existing row until commit, so concurrent
+    increments queue instead of overwriting each other. Rows go in key order
+    so two transactions never lock the same rows in opposite orders. An
+    insert that loses a race to a concurrent one is rolled back to its
+    savepoint and retried as an update.
     """
-    Get all scores for a student.
+    table = model.__table__
+    results = []
+    for row in sorted(rows, key=lambda row: tuple(row[name] for name in keys)):
+        where = and_(*(table.c[name] == row[name] for name in keys))
+        others = {name: value for name, value in row.items() if name not in keys and name != column}
+        for attempt in range(2):
+            if db.execute(select(table.c[column]).where(where).with_for_update()).first() is not None:
+                db.execute(update(table).where(where).values(
+                    **others, **{column: func.coalesce(table.c[column], 0) + row[column]}
+                ))
+                break
+            try:
+                with db.begin_nested():
+                    db.execute(insert(table).values(row))
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+        results.append(db.execute(select(table).where(where)).one())
+    return results
+
+def _increment_rows(db: Session, model, keys: list, column: str, rows: list) -> list:
+    """Insert rows, or add each row's column value to the existing row with the same keys.
+
+    One statement on the server for all rows (INSERT ... ON DUPLICATE KEY
+    UPDATE on MySQL, INSERT ... ON CONFLICT DO UPDATE on SQLite and
+    PostgreSQL), so concurrent increments of the same row never lose each
+    other's updates. Other dialects fall back to _increment_rows_locked.
+    Other columns in rows overwrite the stored values. Returns the
+    resulting rows.
     """
-    return db.query(StudentScore).filter(StudentScore.user_id == user_id).all()
+    table = model.__table__
+    rows = [{**row, column: float(row[column])} for row in rows]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(table).values(rows)
+        new = statement.inserted
+    elif dialect in _ON_CONFLICT_INSERTS:
+        statement = _ON_CONFLICT_INSERTS[dialect](table).values(rows)
+        new = statement.excluded
+    else:
+        return _increment_rows_locked(db, model, keys, column, rows)
+    assignments = {name: new[name] for name in rows[0] if name not in keys}
+    assignments[column] = func.coalesce(table.c[column], 0) + new[column]
+
+    if dialect in ("mysql", "mariadb"):
+        db.execute(statement.on_duplicate_key_update(assignments))
+        # The rows stay locked by this transaction, so this reads our own writes
+        key_columns = tuple_(*(table.c[name] for name in keys))
+        return db.execute(
+            select(table).where(key_columns.in_([tuple(row[name] for name in keys) for row in rows]))
+        ).all()
+    # SQLite's RETURNING hands back whole REAL values as integers; cast keeps 10.0 a float
+    returned = [cast(c, c.type).label(c.name) if c.name == column else c for c in table.c]
+    return db.execute(
+        statement.on_conflict_do_update(index_elements=keys, set_=assignments).returning(*returned)
+    ).all()
 
-def get_module_scores(db: Session, module_id: int):
+def _increment(db: Session, model, keys: dict, column: str, delta: float, touched: dict):
+    """_increment_rows for a single row; returns that row"""
+    return _increment_rows(db, model, list(keys), column, [{**keys, column: delta, **touched}])[0]
+
+def add_to_user_total(db: Session, user_id: int, delta: float) -> None:
+    """Add delta to the user's leaderboard total; the caller commits together
+    with the student_scores change"""
+    if not delta:
+        return
+    _increment(db, UserTotalScore, {"user_id": user_id}, "total_score", delta,
+               {"updated_at": datetime.utcnow()})
+
+def add_score(db: Session, user_id: int, module_id: int, delta: float):
+    """Add delta to the user's module score and leaderboard total (not committed).
+
+    Returns the student_scores row after the increment.
     """
-    Get all student scores for a module.
+    student_score = _increment(db, StudentScore, {"user_id": user_id, "module_id": module_id},
+                               "total_score", delta, {"completed_at": datetime.utcnow()})
+    add_to_user_total(db, user_id, delta)
+    return student_score
+
+def apply_score_deltas(db: Session, rows: list) -> list:
+    """Add many (user, module) deltas at once: one upsert for student_scores and
+    one for user_total_scores (not committed).
+
+    rows are dicts with user_id, module_id, total_score (the delta) and
+    completed_at. Returns the student_scores rows after the increment.
     """
-    return db.query(StudentScore).filter(StudentScore.module_id == module_id).order_by(StudentScore.total_score.desc()).all()
+    if not rows:
+        return []
+    student_scores = _increment_rows(db, StudentScore, ["user_id", "module_id"], "total_score", rows)
+    totals = {}
+    for row in rows:
+        totals[row["user_id"]] = totals.get(row["user_id"], 0.0) + row["total_score"]
+    now = datetime.utcnow()
+    _increment_rows(db, UserTotalScore, ["user_id"], "total_score", [
+        {"user_id": user_id, "total_score": total, "updated_at": now} for user_id, total in totals.items()
+    ])
+    return student_scores
+
+def add_scores(db: Session, user_id: int, deltas: dict, completed_at: dict = None) -> list:
+    """add_score for several modules at once (module_id -> delta), in one upsert
+    for student_scores and one for the leaderboard total (not committed)"""
+    now = datetime.utcnow()
+    completed_at = completed_at or {}
+    return apply_score_deltas(db, [
+        {"user_id": user_id, "module_id": module_id, "total_score": delta,
+         "completed_at": completed_at.get(module_id, now)}
+        for module_id, delta in deltas.items()
+    ])
+
+def rebuild_user_totals(db: Session) -> int:
+    """Recompute user_total_scores from student_scores (backfill/repair)"""
+    db.execute(delete(UserTotalScore))
+    totals = (
+        db.query(
+            StudentScore.user_id,
+            func.coalesce(func.sum(StudentScore.total_score), 0).label("total_score")
+        )
+        .group_by(StudentScore.user_id)
+        .all()
+    )
+    now = datetime.utcnow()
+    if totals:
+        db.execute(insert(UserTotalScore), [
+            {"user_id": row.user_id, "total_score": row.total_score, "updated_at": now}
+            for row in totals
+        ])
+    db.commit()
+    return len(totals)
+
+def _leaderboard_entry(rank: int, user_id: int, email: str, total_score: float) -> dict:
+    return {"rank": rank, "user_id": user_id, "email": email, "total_score": total_score}
+
+def _ranked_before(total_score: float, user_id: int):
+    """Rows ordered ahead of (total_score, user_id): higher score, ties by lower id"""
+    return or_(
+        UserTotalScore.total_score > total_score,
+        and_(UserTotalScore.total_score == total_score, UserTotalScore.user_id < user_id)
+    )
+
+def get_leaderboard_page(db: Session, skip: int = 0, limit: int = 50) -> List[dict]:
+    """Top of the leaderboard, read in index order"""
+    rows = (
+        db.query(UserTotalScore.user_id, User.email, UserTotalScore.total_score)
+        .join(User, User.id == UserTotalScore.user_id)
+        .order_by(UserTotalScore.total_score.desc(), UserTotalScore.user_id.asc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [_leaderboard_entry(skip + i + 1, *row) for i, row in enumerate(rows)]
+
+def get_user_rank(db: Session, user_id: int, email: str) -> dict:
+    """The user's leaderboard entry; rank is an index range count, not a scan"""
+    total = db.get(UserTotalScore, user_id)
+    total_score = total.total_score if total else 0.0
+    ahead = db.query(func.count()).select_from(UserTotalScore).filter(
+        _ranked_before(total_score, user_id)
+    ).scalar()
+    return _leaderboard_entry(ahead + 1, user_id, email, total_score)
+
+def get_leaderboard_window(db: Session, entry: dict, radius: int = 5) -> List[dict]:
+    """Up to radius players either side of entry, plus entry itself"""
+    total_score, user_id, rank = entry["total_score"], entry["user_id"], entry["rank"]
+    above = (
+        db.query(UserTotalScore.user_id, User.email, UserTotalScore.total_score)
+        .join(User, User.id == UserTotalScore.user_id)
+        .filter(_ranked_before(total_score, user_id))
+        .order_by(UserTotalScore.total_score.asc(), UserTotalScore.user_id.desc())
+        .limit(radius)
+        .all()
+    )
+    below = (
+        db.query(UserTotalScore.user_id, User.email, UserTotalScore.total_score)
+        .join(User, User.id == UserTotalScore.user_id)
+        .filter(
+            UserTotalScore.user_id != user_id,
+            ~_ranked_before(total_score, user_id)
+        )
+        .order_by(UserTotalScore.total_score.desc(), UserTotalScore.user_id.asc())
+        .limit(radius)
+        .all()
+    )
+    window = [_leaderboard_entry(rank - i - 1, *row) for i, row in enumerate(above)][::-1]
+    window.append(entry)
+    window.extend(_leaderboard_entry(rank + i + 1, *row) for i, row in enumerate(below))
+    return window
 
 def unlock_next_content(db, module_id, user_id=None):
     """
@@ -568,4 +901,72 @@ def unlock_next_content(db, module_id, user_id=None):
         else:
             next_progress.locked = False
         db.commit()
-    return next_module
\ No newline at end of file
+    return next_module
+
+# ==================== TABLE COUNTERS ====================
+
+# Tables reported by /admin/stats, keyed by counter name
+COUNTED_MODELS = {
+    "users": User,
+    "courses": Course,
+    "modules": Module,
+    "resources": Resource,
+    "videos": Video,
+    "pdfs": PDF,
+    "activities": Activity,
+    "uploads": UploadedFile,
+}
+_COUNTER_NAMES = {model: name for name, model in COUNTED_MODELS.items()}
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_rows(session, flush_context):
+    """Apply row-count deltas in the same transaction as the insert/delete.
+
+    Hooked on every Session, so the create_*/delete_* functions above and
+    the sqladmin views both keep table_counters current.
+    """
+    deltas = {}
+    for obj in session.new:
+        name = _COUNTER_NAMES.get(type(obj))
+        if name:
+            deltas[name] = deltas.get(name, 0) + 1
+    for obj in session.deleted:
+        name = _COUNTER_NAMES.get(type(obj))
+        if name:
+            deltas[name] = deltas.get(name, 0) - 1
+    connection = session.connection()
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(TableCounter)
+                .where(TableCounter.name == name)
+                .values(value=TableCounter.value + delta, updated_at=datetime.utcnow())
+            )
+
+def refresh_table_counters(db: Session) -> List[TableCounter]:
+    """Reconcile every counter with an exact COUNT(*)"""
+    now = datetime.utcnow()
+    for name, model in COUNTED_MODELS.items():
+        total = db.query(func.count(model.id)).scalar()
+        counter = db.get(TableCounter, name)
+        if counter is None:
+            counter = TableCounter(name=name)
+            db.add(counter)
+        counter.value = total
+        counter.updated_at = now
+        counter.reconciled_at = now
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker created the row first; its count is as good as ours
+            db.rollback()
+    return get_table_counters(db)
+
+def get_table_counters(db: Session) -> List[TableCounter]:
+    """Get all table counters (a single small primary-key scan)"""
+    return db.query(TableCounter).all()
+
+def get_table_counter(db: Session, name: str) -> Optional[int]:
+    """Current value of one table counter, None before the first refresh"""
+    counter = db.get(TableCounter, name)
+    return counter.value if counter else None
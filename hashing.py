@@ -0,0 +1,176 @@
+# hashing.py - bcrypt hashing offloaded to a bounded worker pool
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")  # "process" or "thread"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", str(HASH_WORKERS * 8)))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+# Where the calibrated cost is kept, so every worker and restart uses the same one
+BCRYPT_ROUNDS_PATH = os.getenv("BCRYPT_ROUNDS_PATH", "bcrypt_rounds.txt")
+
+# Cost used for new hashes; set by configure_rounds() / calibrate_rounds()
+bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=bcrypt_rounds)
+
+
+class HashingQueueFull(Exception):
+    """Raised when the hashing pool already has HASH_MAX_QUEUE jobs in flight"""
+
+
+# Worker functions live at module level so a process pool can pickle them
+def _hash(password: str, rounds: int) -> str:
+    return pwd_context.handler("bcrypt").using(rounds=rounds).hash(password)
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def configure_rounds(rounds: int):
+    """Use ``rounds`` for every new hash, in the pool and in sync callers"""
+    global bcrypt_rounds
+    bcrypt_rounds = rounds
+    pwd_context.update(bcrypt__rounds=rounds)
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """Pick the bcrypt cost whose hash time is closest to ``target_ms``.
+
+    bcrypt time doubles per round, so one timed hash at the minimum cost
+    is enough to extrapolate.
+    """
+    started = time.perf_counter()
+    _hash("calibration", BCRYPT_MIN_ROUNDS)
+    base_ms = (time.perf_counter() - started) * 1000
+    rounds = BCRYPT_MIN_ROUNDS
+    while rounds < BCRYPT_MAX_ROUNDS and abs(base_ms * 2 - target_ms) < abs(base_ms - target_ms):
+        base_ms *= 2
+        rounds += 1
+    return rounds
+
+def stored_rounds(path: str = BCRYPT_ROUNDS_PATH) -> int:
+    """The cost calibrated by the first worker to start; calibrates and stores it when there is none.
+
+    Workers starting together may all calibrate, but os.link() lets only
+    one of them publish, and everyone reads back the published value.
+    """
+    if not os.path.exists(path):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bcrypt_rounds.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{calibrate_rounds()}\n")
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return int(f.read().strip())
+
+def configure() -> int:
+    """Apply BCRYPT_ROUNDS, or the stored calibration against BCRYPT_TARGET_MS when it is unset"""
+    rounds = os.getenv("BCRYPT_ROUNDS")
+    configure_rounds(int(rounds) if rounds else stored_rounds())
+    pool.start()
+    return bcrypt_rounds
+
+def hash_cost(hashed_password: str) -> Optional[int]:
+    """Return the cost factor encoded in a ``$2b$12$...`` hash"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash is weaker than the configured cost; a stronger one is never lowered"""
+    cost = hash_cost(hashed_password)
+    if cost is not None and cost > bcrypt_rounds:
+        return False
+    return cost != bcrypt_rounds or pwd_context.needs_update(hashed_password)
+
+
+class HashingPool:
+    """Dedicated executor for bcrypt with a hard cap on queued + running jobs"""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE,
+                 kind: str = HASH_EXECUTOR):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "thread":
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix="bcrypt")
+                else:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args):
+        executor = self._executor or self.start()
+        with self._lock:
+            if self.in_flight >= self.max_queue:
+                self.rejected += 1
+                raise HashingQueueFull("Password hashing queue is full")
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.workers, 0),
+                "peak_in_flight": self.peak_in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "bcrypt_rounds": bcrypt_rounds,
+            }
+
+
+pool = HashingPool()
+
+
+async def hash_password(password: str) -> str:
+    return await pool.run(_hash, password, bcrypt_rounds)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await pool.run(_verify, plain_password, hashed_password)
@@ -3,9 +3,10 @@ from fastapi import UploadFile,File,Path,Body
 from sqlalchemy import func,desc
 
 import shutil
-from googletrans import Translator# import argostranslate.package, argostranslate.translate
-# from textblob import TextBlob
-# from spellchecker import SpellChecker
+import asyncio
+import translator# import argostranslate.package, argostranslate.translate
+import spell
+import catalog_cache
 from fastapi import Query
 from typing import List
 import glob
@@ -21,11 +22,21 @@ from fastapi import FastAPI, Depends, HTTPException, Response, Request, Query
 from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import SessionLocal, engine, Base
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine, Base, THREADPOOL_SIZE, pool_status
+import anyio.to_thread
 import crud, schemas
-from auth import create_access_token, verify_token
+import upload_store
+import progress
+import score_events
+from media import MediaFiles, media_response
+import async_crud
+from sqlalchemy.ext.asyncio import AsyncSession
+import hashing
+from starlette.concurrency import run_in_threadpool
+from auth import create_access_token, verify_token, principal_cache, Principal
 from typing import List, Optional
 from sqlalchemy import and_, asc
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from models import StudentScore
 from fastapi.staticfiles import StaticFiles
@@ -43,20 +54,17 @@ from fastapi.responses import FileResponse,HTMLResponse
 
 
 # Import your existing models
-from models import User, Course, Module, Video, Activity, PDF, Resource, UserModuleProgress
+from models import User, Course, Module, Video, Activity, PDF, Resource, UserModuleProgress, UserTotalScore
 
 app = FastAPI(title="Learning Management System API", version="1.0.0")
 # Define upload directory
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = upload_store.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Mount static files to serve uploaded files
-app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
-
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="files")
+# Uploaded files are served by the /files/{filename} route (content-addressed store)
 # Serve the 'videos' folder at /videos
-app.mount("/videos", StaticFiles(directory="videos"), name="videos")
-app.mount("/pdf", StaticFiles(directory="pdf"), name="pdf")
+app.mount("/videos", MediaFiles(directory="videos"), name="videos")
+app.mount("/pdf", MediaFiles(directory="pdf"), name="pdf")
 
 
 # CORS for Flutter local dev
@@ -81,17 +89,164 @@ def get_db():
         yield db
     finally:
         db.close()
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 # Initialize the database
 # Create SQLAlchemy tables
 Base.metadata.create_all(bind=engine)
 
+@app.on_event("startup")
+async def size_threadpool():
+    # At least AnyIO's default, more when the DB pool is larger (see database.THREADPOOL_SIZE)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@app.on_event("startup")
+def start_hashing_pool():
+    rounds = hashing.configure()
+    print(f"Password hashing: bcrypt cost {rounds} on a {hashing.pool.kind} pool")
+
+@app.on_event("shutdown")
+def stop_hashing_pool():
+    hashing.pool.shutdown()
+
+@app.on_event("startup")
+async def load_spell_index():
+    # Built once (or read back from SPELL_INDEX_PATH) and shared read-only by every request
+    try:
+        await run_in_threadpool(spell.service.load)
+        print(f"Spell index loaded from {spell.service.loaded_from} in {spell.service.load_seconds:.2f}s")
+    except spell.SpellcheckUnavailable as e:
+        print("Spellcheck disabled:", e)
+
+@app.on_event("shutdown")
+def close_translation_memory():
+    translator.service.memory.close()
+
+# Exact COUNT(*) reconciliation of the /admin/stats counters
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "600"))
+
+def refresh_stats():
+    db = SessionLocal()
+    try:
+        crud.refresh_table_counters(db)
+    finally:
+        db.close()
+
+async def refresh_stats_periodically():
+    while True:
+        try:
+            await run_in_threadpool(refresh_stats)
+        except Exception as e:
+            print("Stats refresh failed:", e)
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+
+def backfill_leaderboard():
+    db = SessionLocal()
+    try:
+        if not db.query(UserTotalScore).first() and db.query(StudentScore).first():
+            print(f"Leaderboard backfilled for {crud.rebuild_user_totals(db)} users")
+    finally:
+        db.close()
+
+def init_catalog_version():
+    db = SessionLocal()
+    try:
+        catalog_cache.ensure_version_row(db)
+        filled = crud.fill_activity_name_keys(db)
+        if filled:
+            print(f"Filled name_key for {filled} activities")
+        catalog_cache.activities.warm(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_catalog_cache():
+    await run_in_threadpool(init_catalog_version)
+
+@app.on_event("startup")
+async def start_leaderboard():
+    await run_in_threadpool(backfill_leaderboard)
+
+@app.on_event("startup")
+async def start_stats_refresh():
+    app.state.stats_refresh_task = asyncio.create_task(refresh_stats_periodically())
+
+@app.on_event("shutdown")
+async def stop_stats_refresh():
+    app.state.stats_refresh_task.cancel()
+
+# Out-of-band changes under uploads/ (manual copies, restores, deletes)
+UPLOAD_RECONCILE_SECONDS = float(os.getenv("UPLOAD_RECONCILE_SECONDS", "3600"))
+
+def reconcile_uploads():
+    db = SessionLocal()
+    try:
+        result = upload_store.reconcile_uploads(db, UPLOAD_DIR)
+        if any(result.values()):
+            print("Uploads reconciled:", result)
+        return result
+    finally:
+        db.close()
+
+async def reconcile_uploads_periodically():
+    while True:
+        try:
+            await run_in_threadpool(reconcile_uploads)
+        except Exception as e:
+            print("Upload reconcile failed:", e)
+        await asyncio.sleep(UPLOAD_RECONCILE_SECONDS)
+
+@app.on_event("startup")
+async def start_upload_reconcile():
+    app.state.upload_reconcile_task = asyncio.create_task(reconcile_uploads_periodically())
+
+@app.on_event("shutdown")
+async def stop_upload_reconcile():
+    app.state.upload_reconcile_task.cancel()
+
+# Score events are folded into student_scores every SCORE_AGGREGATE_SECONDS
+
+def aggregate_scores():
+    db = SessionLocal()
+    try:
+        return score_events.aggregator.drain(db)
+    finally:
+        db.close()
+
+async def aggregate_scores_periodically():
+    while True:
+        try:
+            await run_in_threadpool(aggregate_scores)
+        except Exception as e:
+            print("Score aggregation failed:", e)
+        await asyncio.sleep(score_events.SCORE_AGGREGATE_SECONDS)
+
+def init_score_events():
+    db = SessionLocal()
+    try:
+        score_events.retire_watermark(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_score_aggregator():
+    await run_in_threadpool(init_score_events)
+    app.state.score_aggregator_task = asyncio.create_task(aggregate_scores_periodically())
+
+@app.on_event("shutdown")
+async def stop_score_aggregator():
+    app.state.score_aggregator_task.cancel()
+    # Fold what is left so a restart does not add a full interval of lag
+    await run_in_threadpool(aggregate_scores)
+
 # Authentication backend for admin
 class AdminAuth(AuthenticationBackend):
     async def login(self, request: StarletteRequest) -> bool:
         form = await request.form()
         username, password = form["username"], form["password"]
         
-        if authenticate_user(username, password):
+        if await authenticate_user(username, password):
             request.session.update({"admin": "authenticated"})
             return True
         return False
@@ -149,6 +304,12 @@ class UserAdmin(ModelView, model=User):
                 data["password"] = crud.hash_password(data["password"])
         return data  # Make sure to return the modified data
 
+    async def after_model_change(self, data, model, is_created, request):
+        principal_cache.invalidate_user(model.id)
+
+    async def after_model_delete(self, model, request):
+        principal_cache.invalidate_user(model.id)
+
 class UserActivityProgressAdmin(ModelView, model=UserActivityProgress):
     name = "User Activity Progress"
     name_plural = "User Activities Progress"
@@ -371,10 +532,19 @@ admin.add_view(UserActivityProgressAdmin)
 
 # Helper function to get current user
 def get_current_user(request: Request, db: Session = Depends(get_db)):
+    """Resolve the cookie token to a Principal snapshot.
+
+    Verified tokens are served from principal_cache, so a cache hit does
+    neither the JWT decode nor the users-table lookup.
+    """
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    
+
+    principal = principal_cache.get(token)
+    if principal:
+        return principal
+
     user_data = verify_token(token)
     if not user_data:
         raise HTTPException(status_code=403, detail="Invalid token")
@@ -382,8 +552,10 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     user = crud.get_user_by_email(db, user_data["sub"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    return user
+
+    principal = Principal(id=user.id, email=user.email, is_admin=bool(user.is_admin))
+    principal_cache.put(token, principal, token_exp=user_data.get("exp"))
+    return principal
 
 # Helper function to check admin permissions
 def get_admin_user(current_user: User = Depends(get_current_user)):
@@ -394,45 +566,76 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+# Helper function for endpoints that work anonymously but record who called them
+def get_optional_user(request: Request, db: Session = Depends(get_db)) -> Optional[Principal]:
+    if not request.cookies.get("access_token"):
+        return None
+    try:
+        return get_current_user(request, db)
+    except HTTPException:
+        return None
+
 # Helper function for read-only access (all authenticated users)
 def get_authenticated_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
+# bcrypt runs on hashing.pool, so these handlers are async and keep their
+# (short) database calls on the threadpool via run_in_threadpool.
+
 @app.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user (anyone can register, but not as admin)"""
-    db_user = crud.get_user_by_email(db, user.email)
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Only allow admin creation if no users exist (first user) or if requested by existing admin
     is_admin = False
-    existing_users = crud.get_users(db, limit=1)
+    existing_users = await run_in_threadpool(crud.get_users, db, limit=1)
     if not existing_users:  # First user becomes admin
         is_admin = True
     
-    return crud.create_user(db, user.email, user.password, is_admin)
+    password_hash = await hashing.hash_password(user.password)
+    return await run_in_threadpool(crud.create_user, db, user.email, user.password, is_admin,
+                                   password_hash=password_hash)
 
 @app.post("/admin/register", response_model=schemas.User)
-def admin_register(user: schemas.UserCreate, db: Session = Depends(get_db), 
+async def admin_register(user: schemas.UserCreate, db: Session = Depends(get_db), 
                    admin_user: User = Depends(get_admin_user)):
     """Register a new user with admin privileges (admin only)"""
-    db_user = crud.get_user_by_email(db, user.email)
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user.email, user.password, user.is_admin)
+    password_hash = await hashing.hash_password(user.password)
+    return await run_in_threadpool(crud.create_user, db, user.email, user.password, user.is_admin,
+                                   password_hash=password_hash)
 
-def authenticate_user(username: str, password: str):
-    db = SessionLocal() 
-    user = db.query(User).filter(User.email == username).first()
-    if not user:
-        return None
-    print(f"Authenticating user: {user.email}, is_admin: {user.is_admin}")
-    
-    if not crud.verify_password(password, user.password) and user.is_admin:
-        return None
+async def verify_and_upgrade_password(db: Session, db_user: User, password: str) -> bool:
+    """Check a password on the hashing pool and re-hash it if its cost is outdated"""
+    if not await hashing.verify_password(password, db_user.password):
+        return False
+    if hashing.needs_rehash(db_user.password):
+        try:
+            password_hash = await hashing.hash_password(password)
+        except hashing.HashingQueueFull:
+            return True  # Upgrade on a later login instead of failing this one
+        await run_in_threadpool(crud.set_password_hash, db, db_user.id, password_hash)
+    return True
+
+async def authenticate_user(username: str, password: str):
+    db = SessionLocal()
+    try:
+        user = await run_in_threadpool(crud.get_user_by_email, db, username)
+        if not user:
+            return None
+        print(f"Authenticating user: {user.email}, is_admin: {user.is_admin}")
+
+        if not user.is_admin or not await verify_and_upgrade_password(db, user, password):
+            return None
+    finally:
+        db.close()
     # token = create_access_token({"sub": user.email})
 
     # # ✅ Set cookie
@@ -448,13 +651,15 @@ def authenticate_user(username: str, password: str):
     
     return user
 @app.post("/login", response_model=schemas.GenericResponse)
-def login(user: schemas.UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, response: Response, db: Session = Depends(get_db)):
     """Login user"""
-    db_user = crud.get_user_by_email(db, user.email)
-    if not db_user or not crud.verify_password(user.password, db_user.password):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
+    # The stored address, read before a rehash commit expires db_user
+    email = db_user.email if db_user else None
+    if not db_user or not await verify_and_upgrade_password(db, db_user, user.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    token = create_access_token({"sub": db_user.email})
+    token = create_access_token({"sub": email})
     
     response.set_cookie(
         key="access_token",
@@ -530,51 +735,6 @@ def get_courses(
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get all courses with user-specific progress"""
-    first_course = db.query(Course).order_by(Course.id.asc()).first()
-
-    if first_course:
-        # Check if course progress already exists
-        existing_course_progress = db.query(UserCourseProgress).filter_by(
-            user_id=current_user.id,
-            course_id=first_course.id
-        ).first()
-
-        # If not already created, unlock course
-        if not existing_course_progress:
-            course_progress = UserCourseProgress(
-                user_id=current_user.id,
-                course_id=first_course.id,
-                locked=False,
-                completed=False
-            )
-            db.add(course_progress)
-
-        # Get the first module in the first course
-        first_module = (
-            db.query(Module)
-            .filter(Module.course_id == first_course.id)
-            .order_by(Module.id.asc())
-            .first()
-        )
-
-        if first_module:
-            # Check if module progress already exists
-            existing_module_progress = db.query(UserModuleProgress).filter_by(
-                user_id=current_user.id,
-                module_id=first_module.id
-            ).first()
-
-            # If not already created, unlock module
-            if not existing_module_progress:
-                module_progress = UserModuleProgress(
-                    user_id=current_user.id,
-                    module_id=first_module.id,
-                    locked=False,
-                    completed=False
-                )
-                db.add(module_progress)
-
-        db.commit()
     return crud.get_courses_with_progress(db, current_user.id)
 
 @app.get("/courses/{course_id}", response_model=schemas.Course)
@@ -618,13 +778,17 @@ def create_module(module: schemas.ModuleCreate, db: Session = Depends(get_db),
 
 @app.get("/modules", response_model=List[schemas.Module])
 def get_modules(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db),
     current_user: User = Depends(get_authenticated_user)  # Add authentication
 ):
     """Get all modules (authenticated users only)"""
-    return crud.get_modules(db, skip=skip, limit=limit)
+    return catalog_cache.cached_response(
+        request, db, List[schemas.Module], ("modules", skip, limit),
+        lambda: crud.get_modules(db, skip=skip, limit=limit)
+    )
 
 @app.get("/modules/{module_id}", response_model=schemas.ModuleResource)
 def get_module(
@@ -738,9 +902,12 @@ def create_video(video: schemas.VideoCreate, db: Session = Depends(get_db),
     return crud.create_video(db, video.title, video.url, video.module_id, video.thumbnail)
 
 @app.get("/videos", response_model=List[schemas.Video])
-def get_videos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_videos(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all videos (public access)"""
-    return crud.get_videos(db, skip=skip, limit=limit)
+    return catalog_cache.cached_response(
+        request, db, List[schemas.Video], ("videos", skip, limit),
+        lambda: crud.get_videos(db, skip=skip, limit=limit)
+    )
 
 @app.get("/videos/{video_id}", response_model=schemas.Video)
 def get_video(video_id: int, db: Session = Depends(get_db)):
@@ -783,9 +950,12 @@ def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_
                               activity.completed, activity.score)
 
 @app.get("/activities", response_model=List[schemas.Activity])
-def get_activities(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_activities(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all activities (public access)"""
-    return crud.get_activities(db, skip=skip, limit=limit)
+    return catalog_cache.cached_response(
+        request, db, List[schemas.Activity], ("activities", skip, limit),
+        lambda: crud.get_activities(db, skip=skip, limit=limit)
+    )
 
 @app.get("/activities/{activity_id}", response_model=schemas.Activity)
 def get_activity(activity_id: int, db: Session = Depends(get_db)):
@@ -827,9 +997,12 @@ def create_pdf(pdf: schemas.PDFCreate, db: Session = Depends(get_db),
     return crud.create_pdf(db, pdf.title, pdf.url, pdf.module_id, pdf.thumbnail)
 
 @app.get("/pdfs", response_model=List[schemas.PDF])
-def get_pdfs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_pdfs(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all PDFs (public access)"""
-    return crud.get_pdfs(db, skip=skip, limit=limit)
+    return catalog_cache.cached_response(
+        request, db, List[schemas.PDF], ("pdfs", skip, limit),
+        lambda: crud.get_pdfs(db, skip=skip, limit=limit)
+    )
 
 @app.get("/pdfs/{pdf_id}", response_model=schemas.PDF)
 def get_pdf(pdf_id: int, db: Session = Depends(get_db)):
@@ -865,28 +1038,54 @@ def delete_pdf(pdf_id: int, db: Session = Depends(get_db),
 # ==================== UTILITY ENDPOINTS ====================
 
 @app.get("/courses/{course_id}/complete", response_model=schemas.Course)
-def get_course_with_modules(course_id: int, db: Session = Depends(get_db)):
+def get_course_with_modules(course_id: int, request: Request, db: Session = Depends(get_db)):
     """Get course with all its modules and nested content (public access)"""
-    db_course = crud.get_course_with_modules(db, course_id)
-    if not db_course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return db_course
+    def load():
+        db_course = crud.get_course_with_modules(db, course_id)
+        if not db_course:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return db_course
+    return catalog_cache.cached_response(request, db, schemas.Course, ("course_complete", course_id), load)
+
+@app.get("/courses/{course_id}/tree", response_model=schemas.CourseTree, response_model_exclude_unset=True)
+def get_course_tree(
+    course_id: int,
+    request: Request,
+    depth: int = Query(crud.COURSE_TREE_MAX_DEPTH, ge=0, le=crud.COURSE_TREE_MAX_DEPTH),
+    db: Session = Depends(get_db)
+):
+    """Course -> modules -> resources -> videos/PDFs/activities down to ``depth`` (public access)
+
+    depth=0 course only, 1 adds modules, 2 resources, 3 content; one query per level.
+    """
+    def load():
+        tree = crud.get_course_tree(db, course_id, depth)
+        if not tree:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return tree
+    return catalog_cache.cached_response(
+        request, db, schemas.CourseTree, ("course_tree", course_id, depth), load, exclude_unset=True
+    )
 
 @app.get("/modules/{module_id}/complete", response_model=schemas.Module)
-def get_module_with_resources(module_id: int, db: Session = Depends(get_db)):
+def get_module_with_resources(module_id: int, request: Request, db: Session = Depends(get_db)):
     """Get module with all its resources and nested content (public access)"""
-    db_module = crud.get_module_with_resources(db, module_id)
-    if not db_module:
-        raise HTTPException(status_code=404, detail="Module not found")
-    return db_module
+    def load():
+        db_module = crud.get_module_with_resources(db, module_id)
+        if not db_module:
+            raise HTTPException(status_code=404, detail="Module not found")
+        return db_module
+    return catalog_cache.cached_response(request, db, schemas.Module, ("module_complete", module_id), load)
 
 @app.get("/resources/{resource_id}/complete", response_model=schemas.Resource)
-def get_resource_with_content(resource_id: int, db: Session = Depends(get_db)):
+def get_resource_with_content(resource_id: int, request: Request, db: Session = Depends(get_db)):
     """Get resource with all its content (videos, PDFs, activities) (public access)"""
-    db_resource = crud.get_resource_with_content(db, resource_id)
-    if not db_resource:
-        raise HTTPException(status_code=404, detail="Resource not found")
-    return db_resource
+    def load():
+        db_resource = crud.get_resource_with_content(db, resource_id)
+        if not db_resource:
+            raise HTTPException(status_code=404, detail="Resource not found")
+        return db_resource
+    return catalog_cache.cached_response(request, db, schemas.Resource, ("resource_complete", resource_id), load)
 
 @app.get("/progress", response_model=List[schemas.CourseProgress])
 def get_user_progress(current_user: User = Depends(get_authenticated_user), db: Session = Depends(get_db)):
@@ -896,53 +1095,28 @@ def get_user_progress(current_user: User = Depends(get_authenticated_user), db:
 @app.post("/modules/{module_id}/complete", response_model=schemas.StudentScore)
 def complete_module(module_id: int, db: Session = Depends(get_db),
                     current_user: User = Depends(get_authenticated_user)):
-    """Mark module as completed and unlock next content (authenticated users only)"""
-    # Mark module as completed
-    print(f"Completing module {module_id} for user {current_user.id}")
-    db_module = crud.update_module(db, module_id, completed=True,user_id=current_user.id)
-    if not db_module:
+    """Mark module as completed, add its score and unlock next content (authenticated users only)"""
+    result = progress.apply_module_progress(db, current_user.id, module_id, completed=True,
+                                            score_mode=progress.SCORE_AWARD)
+    if result is None:
         raise HTTPException(status_code=404, detail="Module not found")
-    
-    # Unlock next content for this user
-    crud.unlock_next_content(db, module_id, user_id=current_user.id)
-    student_score = db.query(StudentScore).filter(
-        StudentScore.user_id == current_user.id,
-        StudentScore.module_id == module_id
-    ).first()
-    
-    return student_score if student_score else {"message": "Module completed successfully"}
-    
+    return result.get("score") or {"message": "Module completed successfully"}
+
 @app.post("/update_score/")
 def update_score(module_id: int, score_to_add: int, db: Session = Depends(get_db),current_user: User = Depends(get_authenticated_user)):
     # Only allow 10, 20, or 30
     # if score_to_add not in [10, 20, 30]:
     #     raise HTTPException(status_code=400, detail="Invalid score. Must be 10, 20, or 30.")
     user_id = current_user.id
-    # Find if the student already has a score entry for the module
-    student_score = db.query(StudentScore).filter_by(user_id=user_id, module_id=module_id).first()
-
-    if not student_score:
-        # Create a new entry if none exists
-        student_score = StudentScore(
-            user_id=user_id,
-            module_id=module_id,
-            total_score=score_to_add,
-            completed_at=datetime.utcnow()
-        )
-        db.add(student_score)
-    else:
-        # Update existing score
-        student_score.total_score = (student_score.total_score or 0) + score_to_add
-        student_score.completed_at = datetime.utcnow()
-
+    # Appended to score_events (or one upsert); concurrent submissions cannot overwrite each other's points
+    student_score = score_events.add_score(db, user_id, module_id, score_to_add)
     db.commit()
-    db.refresh(student_score)
 
     return {
         "message": "Score updated successfully",
-        "user_id": student_score.user_id,
-        "module_id": student_score.module_id,
-        "total_score": student_score.total_score
+        "user_id": student_score["user_id"],
+        "module_id": student_score["module_id"],
+        "total_score": student_score["total_score"]
     }
 
 @app.post("/activities/{activity_id}/submit", response_model=schemas.Activity)
@@ -958,24 +1132,44 @@ def submit_activity(activity_id: int, score: float, db: Session = Depends(get_db
 
 @app.get("/admin/stats", response_model=dict)
 def get_admin_stats(admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    """Get system statistics (admin only)"""
-    total_users = len(crud.get_users(db, limit=10000))
-    total_courses = len(crud.get_courses(db, limit=10000))
-    total_modules = len(crud.get_modules(db, limit=10000))
-    total_resources = len(crud.get_resources(db, limit=10000))
-    total_videos = len(crud.get_videos(db, limit=10000))
-    total_pdfs = len(crud.get_pdfs(db, limit=10000))
-    total_activities = len(crud.get_activities(db, limit=10000))
-    
-    return {
-        "total_users": total_users,
-        "total_courses": total_courses,
-        "total_modules": total_modules,
-        "total_resources": total_resources,
-        "total_videos": total_videos,
-        "total_pdfs": total_pdfs,
-        "total_activities": total_activities
-    }
+    """Get system statistics from table_counters (admin only)"""
+    counters = crud.get_table_counters(db)
+    if len(counters) < len(crud.COUNTED_MODELS):
+        counters = crud.refresh_table_counters(db)
+
+    now = datetime.utcnow()
+    stats = {}
+    stale_seconds = {}
+    for counter in counters:
+        if counter.name not in crud.COUNTED_MODELS:
+            continue
+        stats[f"total_{counter.name}"] = counter.value
+        stale_seconds[counter.name] = (
+            round((now - counter.reconciled_at).total_seconds(), 1) if counter.reconciled_at else None
+        )
+    stats["stale_seconds"] = stale_seconds
+    return stats
+
+@app.post("/admin/stats/refresh", response_model=dict)
+def refresh_admin_stats(admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    """Recount every table now (admin only)"""
+    crud.refresh_table_counters(db)
+    return get_admin_stats(admin_user, db)
+
+@app.post("/admin/uploads/reconcile", response_model=dict)
+async def reconcile_admin_uploads(admin_user: User = Depends(get_admin_user)):
+    """Resync the uploads index with the files on disk now (admin only)"""
+    return await run_in_threadpool(reconcile_uploads)
+
+@app.get("/admin/score-events", response_model=dict)
+def get_score_event_stats(admin_user: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    """Pending score events and aggregator runs (admin only)"""
+    return score_events.aggregator.stats(db)
+
+@app.post("/admin/score-events/aggregate", response_model=dict)
+async def aggregate_score_events(admin_user: User = Depends(get_admin_user)):
+    """Fold all pending score events into student_scores now (admin only)"""
+    return await run_in_threadpool(aggregate_scores)
 
 @app.post("/admin/users/{user_id}/make-admin", response_model=schemas.GenericResponse)
 def make_user_admin(user_id: int, db: Session = Depends(get_db),
@@ -987,6 +1181,7 @@ def make_user_admin(user_id: int, db: Session = Depends(get_db),
     
     db_user.is_admin = True
     db.commit()
+    principal_cache.invalidate_user(user_id)
     return {"message": f"User {db_user.email} is now an admin"}
 
 @app.post("/admin/users/{user_id}/remove-admin", response_model=schemas.GenericResponse)
@@ -1002,8 +1197,43 @@ def remove_user_admin(user_id: int, db: Session = Depends(get_db),
     
     db_user.is_admin = False
     db.commit()
+    principal_cache.invalidate_user(user_id)
     return {"message": f"Admin privileges removed from user {db_user.email}"}
 
+@app.get("/admin/pool", response_model=dict)
+async def get_pool_status(admin_user: User = Depends(get_admin_user)):
+    """Database connection pool occupancy, checkout waits and timeouts (admin only)"""
+    return {
+        "sync": pool_status(engine),
+        "async": pool_status(async_engine.sync_engine),
+        "threadpool_size": anyio.to_thread.current_default_thread_limiter().total_tokens
+    }
+
+@app.get("/admin/hashing", response_model=dict)
+def get_hashing_stats(admin_user: User = Depends(get_admin_user)):
+    """Password hashing pool queue depth and timings (admin only)"""
+    return hashing.pool.stats()
+
+@app.get("/admin/translator", response_model=dict)
+def get_translator_stats(admin_user: User = Depends(get_admin_user)):
+    """Translation memory hit ratio and backend latency (admin only)"""
+    return translator.service.stats()
+
+@app.get("/admin/spellcheck", response_model=dict)
+def get_spellcheck_stats(admin_user: User = Depends(get_admin_user)):
+    """Spell index size, load time and per-word lookup cost (admin only)"""
+    return spell.service.stats()
+
+@app.get("/admin/catalog-cache", response_model=dict)
+def get_catalog_cache_stats(admin_user: User = Depends(get_admin_user)):
+    """Catalog response cache hits, 304s, current catalog version and activity name map (admin only)"""
+    return {**catalog_cache.cache.stats(), "activity_index": catalog_cache.activities.stats()}
+
+@app.get("/admin/auth-cache", response_model=dict)
+def get_auth_cache_stats(admin_user: User = Depends(get_admin_user)):
+    """Principal cache size and hit/miss counters (admin only)"""
+    return principal_cache.stats()
+
 # ==================== HEALTH CHECK ====================
 
 @app.get("/health", response_model=schemas.GenericResponse)
@@ -1044,6 +1274,29 @@ async def authentication_middleware(request: Request, call_next):
     
     return await call_next(request)
 
+@app.exception_handler(hashing.HashingQueueFull)
+async def hashing_queue_full_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server is busy, please try again shortly", "success": False},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(spell.SpellcheckUnavailable)
+async def spellcheck_unavailable_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Spellcheck is not available", "success": False}
+    )
+
+@app.exception_handler(translator.TranslationUnavailable)
+async def translation_unavailable_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Translation is temporarily unavailable", "success": False},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))}
+    )
+
 # Error handler for unauthorized access
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -1063,8 +1316,8 @@ async def http_exception_handler(request, exc):
 @app.post("/modules/{module_id}/user-progress", response_model=schemas.ModuleResponse)
 async def update_user_module_progress(
     module_id: int,
-    progress: dict,
-    db: Session = Depends(get_db),
+    progress_update: dict,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """
@@ -1072,253 +1325,129 @@ async def update_user_module_progress(
     
     Args:
         module_id: ID of the module
-        progress: Dictionary containing "completed" status
+        progress_update: Dictionary containing "completed" status
     """
-    # Verify module exists
-    db_module = crud.get_module(db, module_id)
-    if not db_module:
+    result = await db.run_sync(progress.apply_module_progress, current_user.id, module_id,
+                               progress_update.get("completed"))
+    if result is None:
         raise HTTPException(status_code=404, detail="Module not found")
-    
-    # Get or create user progress
-    user_progress = db.query(UserModuleProgress).filter(
-        UserModuleProgress.user_id == current_user.id,
-        UserModuleProgress.module_id == module_id
-    ).first()
-    
-    if not user_progress:
-        user_progress = UserModuleProgress(
-            user_id=current_user.id,
-            module_id=module_id,
-            locked=False,
-            completed=False
-        )
-        db.add(user_progress)
-    
-    # Update progress
-    user_progress.completed = progress.get("completed", user_progress.completed)
-    user_progress.last_accessed = datetime.utcnow()
-    
-    # If module is completed, unlock next module
-    if user_progress.completed:
-        next_module = db.query(Module).filter(
-            and_(
-                Module.course_id == db_module.course_id,
-                Module.id > module_id
-            )
-        ).order_by(Module.id).first()
-        
-        if next_module:
-            next_progress = db.query(UserModuleProgress).filter(
-                UserModuleProgress.user_id == current_user.id,
-                UserModuleProgress.module_id == next_module.id
-            ).first()
-            
-            if not next_progress:
-                next_progress = UserModuleProgress(
-                    user_id=current_user.id,
-                    module_id=next_module.id,
-                    locked=False,
-                    completed=False
-                )
-                db.add(next_progress)
-            else:
-                next_progress.locked = False
-    
-    db.commit()
-    
-    # Return updated module with progress
-    return {
-        "id": db_module.id,
-        "name": db_module.name,
-        "description": db_module.description,
-        "background_image": db_module.background_image,
-        "course_id": db_module.course_id,
-        "user_progress": {
-            "locked": user_progress.locked,
-            "completed": user_progress.completed,
-            "last_accessed": user_progress.last_accessed.isoformat() if user_progress.last_accessed else None
-        }
-    }
+    return result
 
 @app.get("/students/scores", response_model=List[schemas.StudentScore])
 async def get_student_scores(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get all scores for the current student"""
-    return crud.get_student_scores(db, current_user.id)
+    return await async_crud.get_student_scores(db, current_user.id)
 
 @app.get("/modules/{module_id}/scores", response_model=List[schemas.StudentScore])
 async def get_module_scores(
     module_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get all student scores for a module"""
-    return crud.get_module_scores(db, module_id)
+    return await async_crud.get_module_scores(db, module_id)
 
 @app.post("/modules/{module_id}/complete-progress", response_model=schemas.ModuleResponse)
 async def complete_module_and_progress(
     module_id: int,
-    progress: dict,
-    db: Session = Depends(get_db),
+    progress_update: dict,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """
-    Update user's progress for a specific module and calculate total score if completed.
+    Update user's progress for a specific module and include its score if completed.
     """
-    # Verify module exists
-    db_module = crud.get_module(db, module_id)
-    if not db_module:
+    result = await db.run_sync(progress.apply_module_progress, current_user.id, module_id,
+                               progress_update.get("completed"), progress.SCORE_REPORT)
+    if result is None:
         raise HTTPException(status_code=404, detail="Module not found")
-    
-    # Get or create user progress
-    user_progress = db.query(UserModuleProgress).filter(
-        UserModuleProgress.user_id == current_user.id,
-        UserModuleProgress.module_id == module_id
-    ).first()
-    
-    if not user_progress:
-        user_progress = UserModuleProgress(
-            user_id=current_user.id,
-            module_id=module_id,
-            locked=False,
-            completed=False
-        )
-        db.add(user_progress)
-        db.commit()
-        db.refresh(user_progress)
-    
-    # Update progress
-    completed_now = progress.get("completed", user_progress.completed)
-    user_progress.completed = completed_now
-    user_progress.last_accessed = datetime.utcnow()
-    db.commit()
-    db.refresh(user_progress)
-    
-    student_score = None
-    # If module is completed, unlock next module and calculate score
-    if completed_now:
-        # Unlock next module
-        next_module = db.query(Module).filter(
-            Module.course_id == db_module.course_id,
-            Module.id > module_id
-        ).order_by(Module.id).first()
-        
-        if next_module:
-            next_progress = db.query(UserModuleProgress).filter(
-                UserModuleProgress.user_id == current_user.id,
-                UserModuleProgress.module_id == next_module.id
-            ).first()
-            
-            if not next_progress:
-                next_progress = UserModuleProgress(
-                    user_id=current_user.id,
-                    module_id=next_module.id,
-                    locked=False,
-                    completed=False
-                )
-                db.add(next_progress)
-            else:
-                next_progress.locked = False
-            db.commit()
-        
-        # Calculate and save score
-        student_score = crud.calculate_and_save_student_score(
-            db, current_user.id, module_id
-        )
-    
-    # Build response
-    response = {
-        "id": db_module.id,
-        "name": db_module.name,
-        "description": db_module.description,
-        "background_image": db_module.background_image,
-        "course_id": db_module.course_id,
-        "user_progress": {
-            "locked": user_progress.locked,
-            "completed": user_progress.completed,
-            "last_accessed": user_progress.last_accessed.isoformat() if user_progress.last_accessed else None
-        }
-    }
-    # Optionally include score if completed
-    if student_score:
-        response["score"] = {
-            "total_score": student_score.total_score,
-            "completed_at": student_score.completed_at.isoformat()
-        }
-    return response
+    return result
 
 ## =================== PDF UPLOAD ENDPOINT ====================
 
 from fastapi import Request
 
-@app.post("/upload-pdf")
-async def upload_pdf(request: Request, file: UploadFile = File(...)):
+# The body is parsed by upload_store.receive_pdf as it streams in, not by FastAPI
+UPLOAD_PDF_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+@app.post("/upload-pdf", openapi_extra=UPLOAD_PDF_BODY)
+async def upload_pdf(
+    request: Request,
+    db: Session = Depends(get_db),
+    uploader: Optional[Principal] = Depends(get_optional_user)
+):
     """Upload PDF file and return full file URL"""
     try:
-        print(f"Received file: {file.filename}, content_type: {file.content_type}")
-        
-        # Validate file type
-        if not file.filename or not file.filename.lower().endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-        
-        # Generate unique filename
-        unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        # Stream the "file" field to a temp file as it arrives (.pdf name, size limit, magic bytes, SHA-256)
+        original_name, temp_path, file_size, sha256 = await upload_store.receive_pdf(request, UPLOAD_DIR)
+        print(f"Received file: {original_name}")
         
-        print(f"Saving file to: {file_path}")
-        
-        # Read file content
-        content = await file.read()
-        
-        # Save the file
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        file_size = os.path.getsize(file_path)
-        print(f"File saved successfully. Size: {file_size} bytes")
+        # Every upload gets its own name; identical content shares one blob, stored under its hash
+        db_file, stored = await run_in_threadpool(
+            upload_store.save_upload, db, temp_path, sha256, original_name, file_size,
+            uploader.id if uploader else None, UPLOAD_DIR
+        )
+        filename = db_file.filename
+        file_path = upload_store.blob_path(sha256, UPLOAD_DIR)
+        print(f"File {'saved to' if stored else 'already stored at'} {file_path}. Size: {file_size} bytes")
         
         # Get base URL with IP or domain
         base_url = str(request.base_url).rstrip('/')
-        full_file_url = f"{base_url}/uploads/{unique_filename}"
+        full_file_url = f"{base_url}/files/{filename}"
         
         return {
             "success": True,
-            "filename": unique_filename,
-            "original_name": file.filename,
+            "filename": filename,
+            "original_name": db_file.original_name,
             "file_path": file_path,
             "file_url": full_file_url,
             "size": file_size,
-            "message": "File uploaded successfully"
+            "sha256": sha256,
+            "duplicate": not stored,
+            "message": "File uploaded successfully" if stored else "File already uploaded"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("Upload failed:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def resolve_upload(db: Session, filename: str) -> str:
+    """Map a public upload name to the blob's SHA-256; deleted names stop resolving"""
+    db_file = crud.get_uploaded_file(db, filename)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    return db_file.sha256
+
+
 @app.get("/deletefile/{filename}")
-async def delete_upload(filename: str):
+def delete_upload(filename: str, db: Session = Depends(get_db)):
     """Delete a specific uploaded file"""
     try:
-        # Security validation
-        # if not filename.replace('-', '').replace('_', '').replace('.', '').isalnum():
-        #     raise HTTPException(status_code=400, detail="Invalid filename")
-
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        print(file_path)
-
-        if not os.path.exists(file_path):
+        db_file = crud.get_uploaded_file(db, filename)
+        if not db_file:
             raise HTTPException(status_code=404, detail="File not found")
 
-        os.remove(file_path)
+        # The blob goes only once no other upload name points at it
+        crud.delete_uploaded_file(db, db_file, lambda sha256: upload_store.remove_blob(sha256, UPLOAD_DIR))
         return {
             "success": True,
-            # "filename": file_path,
             "message": "File deleted successfully"
         }
-        return 
     except HTTPException:
         raise
     except Exception as e:
@@ -1327,21 +1456,26 @@ async def delete_upload(filename: str):
 
 # Serve files manually instead of using StaticFiles to avoid conflicts
 @app.get("/files/{filename}")
-async def serve_file(filename: str):
-    """Serve uploaded files"""
+@app.get("/uploads/{filename}")  # legacy URLs returned before the content-addressed store
+def serve_file(filename: str, request: Request, db: Session = Depends(get_db)):
+    """Serve uploaded files (ranges, ETag/304, cached as immutable)"""
     try:
         # Security: only allow alphanumeric, dots, hyphens, underscores
         if not filename.replace('-', '').replace('_', '').replace('.', '').isalnum():
             raise HTTPException(status_code=400, detail="Invalid filename")
         
-        file_path = os.path.join(UPLOAD_DIR, filename)
+        sha256 = resolve_upload(db, filename)
+        file_path = upload_store.blob_path(sha256, UPLOAD_DIR)
         
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        return FileResponse(
+        # A name always maps to the same bytes, so the hash is the ETag
+        return media_response(
+            request.headers,
             file_path,
-            media_type='application/pdf',
+            digest=sha256,
+            immutable=True,
             filename=filename
         )
     except HTTPException:
@@ -1353,24 +1487,45 @@ async def serve_file(filename: str):
 
 
 @app.get("/uploads")
-async def list_uploads(request: Request):
-    """List all uploaded PDF files with metadata"""
+def list_uploads(
+    request: Request,
+    sort: str = Query("created_at", pattern="^(created_at|name|size)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """List uploaded PDF files from the uploads index, one keyset page at a time.
+
+    Pass the returned next_cursor back as ?cursor= for the following page.
+    """
     try:
-        pattern = os.path.join(UPLOAD_DIR, "*_*.pdf")  # matches your naming scheme
+        after = crud.parse_upload_cursor(cursor, sort) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        rows = crud.get_uploaded_files(db, sort=sort, descending=order == "desc", after=after, limit=limit + 1)
+        page, has_next = rows[:limit], len(rows) > limit
+
+        base_url = str(request.base_url).rstrip('/')
         files = []
-        for path in glob.glob(pattern):
-            filename = os.path.basename(path)
-            stat = os.stat(path)
-            base_url = str(request.base_url).rstrip('/')
+        for db_file in page:
             files.append({
-                "filename": filename,
-                "original_name": "_".join(filename.split("_")[1:]),  # best effort
-                
-                "file_url": f"{base_url}/files/{filename}",  # adjust base if needed
-                "size": stat.st_size,
-                "uploaded_at": stat.st_ctime
+                "filename": db_file.filename,
+                "original_name": db_file.original_name,
+                "file_url": f"{base_url}/files/{db_file.filename}",
+                "size": db_file.size,
+                "sha256": db_file.sha256,
+                "uploader_id": db_file.uploader_id,
+                "uploaded_at": db_file.created_at.timestamp() if db_file.created_at else None,
+                "updated_at": db_file.updated_at.timestamp() if db_file.updated_at else None
             })
-        return {"success": True, "files": files}
+        return {
+            "success": True,
+            "files": files,
+            "total": crud.get_table_counter(db, "uploads"),
+            "next_cursor": crud.upload_cursor(page[-1], sort) if has_next else None
+        }
     except Exception as e:
         print("Error listing uploads:", e)
         raise HTTPException(status_code=500, detail="Could not list uploads")
@@ -1633,94 +1788,79 @@ async def upload_page():
     return HTMLResponse(content=html_content)
 @app.post("/translator")
 async def translators(text: str = Body(..., embed=True)):
-    translator = Translator()
-    result = await translator.translate(text, src="en", dest="ta")
-    return {"text": result.text}
+    return {"text": await translator.service.translate(text, src="en", dest="ta")}
+
+@app.post("/translator/batch")
+async def translate_batch(data: schemas.TranslateBatchRequest):
+    """Translate many strings at once; duplicates and remembered strings skip the backend"""
+    translations = await translator.service.translate_many(data.texts, src=data.src, dest=data.dest)
+    return {"translations": translations, "src": data.src, "dest": data.dest}
 @app.get("/")
 async def root():
     return {"message": "PDF Upload Server", "upload_dir": UPLOAD_DIR}
 
-# @app.post("/spellcheck")
-# def spell_check(data: schemas.SpellCheckRequest):
-#     text = data.text
-
-#     # Step 1: TextBlob for best correction
-#     blob = TextBlob(text)
-#     best_correction = str(blob.correct())
-
-#     # Step 2: PySpellChecker for multiple suggestions
-#     spell = SpellChecker()
-#     misspelled = spell.unknown(text.split())
+SPELLCHECK_MAX_BATCH = 100
 
-#     suggestions = {}
-#     for word in misspelled:
-#         suggestions[word] = list(spell.candidates(word))  # Convert set to list for JSON
+@app.post("/spellcheck")
+def spell_check(data: schemas.SpellCheckRequest):
+    """Best correction plus per-word suggestions from the shared spell index"""
+    return spell.service.check(data.text)
 
-#     return {
-#         "original_text": text,
-#         "best_correction": best_correction,
-#         "suggestions": suggestions
-#     }
+@app.post("/spellcheck/batch")
+def spell_check_batch(data: List[schemas.SpellCheckRequest]):
+    """Spellcheck several texts in one request"""
+    if len(data) > SPELLCHECK_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {SPELLCHECK_MAX_BATCH} texts per batch")
+    return {"results": spell.service.check_many([item.text for item in data])}
 
 # IMPORTANT: Put the StaticFiles mount at the very end, or remove it entirely
 # since we're handling file serving manually with the /files/{filename} route above
 # app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
 @app.get("/leaderboard")
 def get_leaderboard(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=200),
+    around: int = Query(5, ge=0, le=50),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """
-    Leaderboard API - returns all users by total score.
-    Also includes current user's rank and score.
+    Leaderboard API - one page of the top players from user_total_scores,
+    plus the current user's rank and the players around them.
+    Players who have never scored are not listed.
     """
-    # Get all users with their total scores
-    leaderboard_data = (
-        db.query(
-            User.id.label("user_id"),
-            User.email.label("email"),
-            func.coalesce(func.sum(StudentScore.total_score), 0).label("total_score")
-        )
-        .join(StudentScore, User.id == StudentScore.user_id, isouter=True)
-        .group_by(User.id, User.email)
-        .order_by(desc("total_score"))
-        .all()
-    )
+    skip = (page - 1) * per_page
+    leaderboard = crud.get_leaderboard_page(db, skip=skip, limit=per_page + 1)
+    has_next = len(leaderboard) > per_page
 
-    # Format leaderboard with rank
-    formatted_leaderboard = [
-        {
-            "rank": idx + 1,
-            "user_id": row.user_id,
-            "email": row.email,
-            "total_score": row.total_score
-        }
-        for idx, row in enumerate(leaderboard_data)
-    ]
-
-    # Find current user's rank & score
-    current_user_rank = next(
-        (entry for entry in formatted_leaderboard if entry["user_id"] == current_user.id),
-        None
-    )
+    current_user_rank = crud.get_user_rank(db, current_user.id, current_user.email)
 
     return {
-        "leaderboard": formatted_leaderboard,
-        "current_user": current_user_rank
+        "leaderboard": leaderboard[:per_page],
+        "current_user": current_user_rank,
+        "around_me": crud.get_leaderboard_window(db, current_user_rank, around),
+        "page": page,
+        "per_page": per_page,
+        "has_next": has_next,
+        "has_prev": page > 1
     }
 @app.get("/score")
 def get_user_score(
+    fresh: bool = Query(False, description="Include score events the aggregator has not folded in yet"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """
     Returns the total score for the authenticated user.
     """
-    total_score = (
-        db.query(func.coalesce(func.sum(StudentScore.total_score), 0))
-        .filter(StudentScore.user_id == current_user.id)
-        .scalar()
-    )
+    if fresh:
+        total_score = score_events.current_total(db, current_user.id)
+    else:
+        total_score = (
+            db.query(func.coalesce(func.sum(StudentScore.total_score), 0))
+            .filter(StudentScore.user_id == current_user.id)
+            .scalar()
+        )
 
     return {
         "user_id": current_user.id,
@@ -1741,19 +1881,15 @@ def complete_activity_with_score(
     # if score_to_add not in [10, 20, 30]:
     #     raise HTTPException(status_code=400, detail="Invalid score. Must be 10, 20, or 30.")
 
-    # ✅ Find activity by name (case-insensitive)
-    activity = (
-        db.query(Activity)
-        .filter(func.lower(Activity.name) == activity_name.lower())
-        .first()
-    )
+    # ✅ Find activity by name (case-insensitive) in the in-process name map
+    activity = catalog_cache.activities.resolve(db, activity_name)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
 
     # ✅ Check if already completed
     progress = db.query(UserActivityProgress).filter_by(
         user_id=current_user.id,
-        activity_id=activity.id
+        activity_id=activity.activity_id
     ).first()
 
     if progress and progress.completed:
@@ -1762,7 +1898,7 @@ def complete_activity_with_score(
     if not progress:
         progress = UserActivityProgress(
             user_id=current_user.id,
-            activity_id=activity.id,
+            activity_id=activity.activity_id,
             completed=True
         )
         db.add(progress)
@@ -1770,36 +1906,47 @@ def complete_activity_with_score(
         progress.completed = True
 
     # ✅ Update student score for the module of this activity
-    module_id = activity.resource.module_id  # assuming `resource` → `module_id` link exists
-    student_score = db.query(StudentScore).filter_by(
-        user_id=current_user.id,
-        module_id=module_id
-    ).first()
-
-    if not student_score:
-        student_score = StudentScore(
-            user_id=current_user.id,
-            module_id=module_id,
-            total_score=score_to_add,
-            completed_at=datetime.utcnow()
-        )
-        db.add(student_score)
-    else:
-        student_score.total_score = (student_score.total_score or 0) + score_to_add
-        student_score.completed_at = datetime.utcnow()
+    module_id = activity.module_id
+    student_score = score_events.add_score(db, current_user.id, module_id, score_to_add)
 
-    db.commit()
-    db.refresh(student_score)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request inserted the progress row first (uix_user_activity)
+        db.rollback()
+        return {"message": f"Activity '{activity_name}' already completed"}
 
     return {
         "message": f"Activity '{activity_name}' marked completed & score updated",
         "activity": activity_name,
         "score_added": score_to_add,
-        "new_total_score": student_score.total_score
+        "new_total_score": student_score["total_score"]
     }
 
-
-
+@app.post("/activities/complete/batch")
+def complete_activities_batch(
+    batch: schemas.ActivityCompletionBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_authenticated_user)
+):
+    """Replay activity completions queued offline; one transaction for the whole batch"""
+    completions = [item.model_dump() for item in batch.completions]
+    try:
+        return progress.apply_activity_completions(db, current_user.id, completions)
+    except (IntegrityError, progress.CompletionRace):
+        # Another request completed one of these activities in between (a uix_user_activity
+        # conflict or a row already flipped); the batch was rolled back, and a second pass
+        # reports it as already_completed
+        return progress.apply_activity_completions(db, current_user.id, completions)
+
+
+# sqladmin mounts itself at /admin as soon as Admin() is created, ahead of
+# every route declared after it. Move that mount to the end so the REST
+# /admin/* routes above stay reachable. Keep this block after all routes.
+for route in list(app.router.routes):
+    if getattr(route, "path", None) == "/admin" and getattr(route, "name", None) == "admin":
+        app.router.routes.remove(route)
+        app.router.routes.append(route)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,100 @@
+# media.py - cacheable, range-aware file responses for /files, /videos and /pdf
+
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Content-addressed uploads never change under a name, so clients may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Lesson videos and PDFs can be replaced in place; clients revalidate with the ETag after this
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "3600"))
+
+# The platform mime table is not always complete (slim containers, Windows)
+mimetypes.add_type("application/pdf", ".pdf")
+mimetypes.add_type("video/mp4", ".mp4")
+mimetypes.add_type("video/mp4", ".m4v")
+mimetypes.add_type("video/webm", ".webm")
+mimetypes.add_type("video/quicktime", ".mov")
+
+
+def content_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def file_etag(stat_result: os.stat_result, digest: Optional[str] = None) -> str:
+    """Strong ETag: the content hash when known, otherwise inode, size and mtime"""
+    if digest:
+        return f'"{digest}"'
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def media_headers(stat_result: os.stat_result, digest: Optional[str] = None,
+                  immutable: bool = False, max_age: int = MEDIA_MAX_AGE) -> dict:
+    if immutable:
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        cache_control = f"public, max-age={max_age}, must-revalidate"
+    return {
+        "etag": file_etag(stat_result, digest),
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: str) -> bool:
+    """RFC 9110 13.2.2: If-None-Match wins; If-Modified-Since only applies without it"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def media_response(request_headers: Headers, path: str, media_type: Optional[str] = None,
+                   digest: Optional[str] = None, immutable: bool = False,
+                   max_age: int = MEDIA_MAX_AGE, filename: Optional[str] = None,
+                   stat_result: Optional[os.stat_result] = None) -> Response:
+    """Serve a file with validators, Cache-Control and byte ranges.
+
+    Conditional requests are answered with 304 here. Range, multi-range
+    (multipart/byteranges) and If-Range handling is FileResponse's: it
+    compares If-Range against the ETag set below and answers 206 or 416.
+    """
+    if stat_result is None:
+        stat_result = os.stat(path)
+    headers = media_headers(stat_result, digest, immutable, max_age)
+    if is_not_modified(request_headers, headers["etag"], headers["last-modified"]):
+        return NotModifiedResponse(Headers(headers))
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type=media_type or content_type(filename or path),
+        filename=filename,
+        stat_result=stat_result,
+    )
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles that answers with media_response (strong ETags, Cache-Control, ranges)"""
+
+    def __init__(self, *args, max_age: int = MEDIA_MAX_AGE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            # html=True 404 pages
+            return super().file_response(full_path, stat_result, scope, status_code)
+        return media_response(Headers(scope=scope), str(full_path), max_age=self.max_age,
+                              stat_result=stat_result)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Text, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Text, DateTime, UniqueConstraint, Index, event
 from database import Base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -57,6 +57,11 @@ class Module(Base):  # Changed from Level
     user_progress = relationship("UserModuleProgress", back_populates="module")
     student_scores = relationship("StudentScore", back_populates="module")
 
+    __table_args__ = (
+        # A course's modules in order, and the module after a given one
+        Index("ix_modules_course_id_id", "course_id", "id"),
+    )
+
     def __repr__(self):
         return f"Module(id={self.id}, name='{self.name}', course_id={self.course_id})"
     
@@ -75,6 +80,10 @@ class Resource(Base):  # Changed from Module
     pdfs = relationship("PDF", back_populates="resource")
     activities = relationship("Activity", back_populates="resource")
 
+    __table_args__ = (
+        Index("ix_resources_module_id_id", "module_id", "id"),
+    )
+
     def __repr__(self):
         return f"Resource(id={self.id}, name='{self.name}', module_id={self.module_id})"
     
@@ -91,28 +100,46 @@ class Video(Base):
     resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False)  # Changed from module_id
     resource = relationship("Resource", back_populates="videos")  # Changed from module
 
+    __table_args__ = (
+        Index("ix_videos_resource_id_id", "resource_id", "id"),
+    )
+
     def __repr__(self):
         return f"Video(id={self.id}, title='{self.title}', resource_id={self.resource_id})"
     
     def __str__(self):
         return f"{self.title} (Resource: {self.resource.name if self.resource else 'N/A'})"
 
+def activity_key(name: Optional[str]) -> Optional[str]:
+    """Lookup form of an activity name: trimmed and lower-cased"""
+    return name.strip().lower() if name is not None else None
+
 class Activity(Base):
     __tablename__ = "activities"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
+    # activity_key(name), kept in step by the listener below so lookups can use an index
+    name_key = Column(String(255), index=True)
 
     resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False)  # Changed from module_id
     resource = relationship("Resource", back_populates="activities")  # Changed from module
     user_progress = relationship("UserActivityProgress", back_populates="activity")
 
+    __table_args__ = (
+        Index("ix_activities_resource_id_id", "resource_id", "id"),
+    )
+
     def __repr__(self):
         return f"Activity(id={self.id}, name='{self.name}', score={self.score})"
     
     def __str__(self):
         return f"{self.name} (Score: {self.name}, Resource: {self.resource_id if self.resource else 'N/A'})"
 
+@event.listens_for(Activity.name, "set")
+def _set_activity_name_key(target, value, oldvalue, initiator):
+    target.name_key = activity_key(value)
+
 class PDF(Base):
     __tablename__ = "pdfs"
 
@@ -123,6 +150,10 @@ class PDF(Base):
 
     resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False)  # Changed from module_id
     resource = relationship("Resource", back_populates="pdfs")  # Changed from module
+
+    __table_args__ = (
+        Index("ix_pdfs_resource_id_id", "resource_id", "id"),
+    )
     # file: Optional[UploadFile] = None
     def __repr__(self):
         return f"PDF(id={self.id}, title='{self.title}', resource_id={self.resource_id})"
@@ -178,6 +209,8 @@ class StudentScore(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'module_id', name='uix_user_module_score'),
+        # Per-module leaderboard
+        Index("ix_student_scores_module_score", "module_id", "total_score"),
     )
 class UserActivityProgress(Base):
     __tablename__ = "user_activity_progress"
@@ -191,5 +224,93 @@ class UserActivityProgress(Base):
     user = relationship("User", back_populates="activity_progress")
     activity = relationship("Activity", back_populates="user_progress")
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'activity_id', name='uix_user_activity'),
+    )
+
     def __repr__(self):
         return f"UserActivityProgress(user_id={self.user_id}, activity_id={self.activity_id}, completed={self.completed})"
+
+
+class TableCounter(Base):
+    """Row count for one table, kept current by crud's flush hook and
+    reconciled by crud.refresh_table_counters()"""
+    __tablename__ = "table_counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # last incremental change
+    reconciled_at = Column(DateTime)  # last exact COUNT(*)
+
+    def __repr__(self):
+        return f"TableCounter(name='{self.name}', value={self.value})"
+
+class UserTotalScore(Base):
+    """Materialized SUM(student_scores.total_score) per user for the leaderboard"""
+    __tablename__ = "user_total_scores"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_score = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        # Leaderboard order (total desc, user_id asc) and rank counts
+        Index("ix_user_total_scores_rank", "total_score", "user_id"),
+    )
+
+    def __repr__(self):
+        return f"UserTotalScore(user_id={self.user_id}, total_score={self.total_score})"
+
+class ScoreEvent(Base):
+    """One score change. The score endpoints only append here; score_events.py folds
+    rows into student_scores and user_total_scores in batches and stamps folded_at,
+    so the table keeps every change and pending rows are the ones with no folded_at"""
+    __tablename__ = "score_events"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    module_id = Column(Integer, ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    delta = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    folded_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # A user's events, pending ones first
+        Index("ix_score_events_user_folded", "user_id", "folded_at", "id"),
+        # The aggregator's backlog in id order
+        Index("ix_score_events_folded", "folded_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"ScoreEvent(user_id={self.user_id}, module_id={self.module_id}, delta={self.delta})"
+
+class UploadedFile(Base):
+    """A public upload name pointing at a content-addressed blob in uploads/.
+
+    Every upload gets its own row and "<uuid>.pdf" name, keeping its
+    original name and uploader; identical files share one blob. Files
+    migrated from the old flat layout keep their "<uuid>_<name>.pdf" name
+    so existing URLs still work. GET /uploads pages over this table;
+    each sort order has an index ending in id so keyset pages are range scans.
+    """
+    __tablename__ = "uploaded_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), unique=True, nullable=False)
+    sha256 = Column(String(64), index=True, nullable=False)
+    original_name = Column(String(255), nullable=False)
+    size = Column(Integer, nullable=False)
+    uploader_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_uploaded_files_created", "created_at", "id"),
+        Index("ix_uploaded_files_name", "original_name", "id"),
+        Index("ix_uploaded_files_size", "size", "id"),
+    )
+
+    def __repr__(self):
+        return f"UploadedFile(filename='{self.filename}', sha256='{self.sha256[:12]}')"
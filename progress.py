@@ -0,0 +1,207 @@
+# progress.py - a user's progress and score changes applied as one transaction with a fixed statement count
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+import catalog_cache
+import score_events
+from models import Module, UserActivityProgress, UserModuleProgress, activity_key
+
+# What a completion does to student_scores
+SCORE_NONE = "none"      # /user-progress: progress only
+SCORE_REPORT = "report"  # /complete-progress: return the score the module's activities built up
+SCORE_AWARD = "award"    # /complete: add modules.score to student_scores and the user's total
+
+
+# ==================== MODULE COMPLETION ====================
+
+def module_and_next(db: Session, module_id: int) -> list:
+    """The module and the one after it in the same course, in one query"""
+    course_id = select(Module.course_id).where(Module.id == module_id).scalar_subquery()
+    return db.execute(
+        select(Module)
+        .where(Module.course_id == course_id, Module.id >= module_id)
+        .order_by(Module.id)
+        .limit(2)
+    ).scalars().all()
+
+def progress_rows(db: Session, user_id: int, module_ids: list) -> dict:
+    """The user's progress rows for several modules, keyed by module id"""
+    rows = db.execute(
+        select(UserModuleProgress).where(
+            UserModuleProgress.user_id == user_id,
+            UserModuleProgress.module_id.in_(module_ids)
+        )
+    ).scalars().all()
+    return {row.module_id: row for row in rows}
+
+def award_module_score(db: Session, user_id: int, module: Module) -> dict:
+    """Add the module's score to the user's student_scores row and leaderboard total (not committed)"""
+    return score_events.add_score(db, user_id, module.id, module.score or 0.0)
+
+def apply_module_progress(db: Session, user_id: int, module_id: int,
+                          completed: Optional[bool], score_mode: str = SCORE_NONE) -> Optional[dict]:
+    """Record a user's progress on a module and unlock the next one if it is completed.
+
+    Everything happens in one transaction: two SELECTs (module plus next
+    module, then both progress rows), the score write and read-back from
+    score_events.add_score when awarding (or one read when reporting), the
+    flushed writes, and a single COMMIT. ``completed=None`` keeps the stored value. Returns the
+    response body (module, user_progress and, when there is one, score) or
+    None if the module does not exist.
+    """
+    modules = module_and_next(db, module_id)
+    if not modules:
+        return None
+    module = modules[0]
+    next_module = modules[1] if len(modules) > 1 else None
+    rows = progress_rows(db, user_id, [m.id for m in modules])
+    now = datetime.utcnow()
+
+    progress = rows.get(module.id)
+    if progress is None:
+        progress = UserModuleProgress(user_id=user_id, module_id=module.id,
+                                      locked=False, completed=bool(completed))
+        db.add(progress)
+    elif completed is not None:
+        progress.completed = completed
+    progress.last_accessed = now
+
+    if progress.completed and next_module is not None:
+        next_progress = rows.get(next_module.id)
+        if next_progress is None:
+            db.add(UserModuleProgress(user_id=user_id, module_id=next_module.id,
+                                      locked=False, completed=False, last_accessed=now))
+        else:
+            next_progress.locked = False
+
+    student_score = None
+    if progress.completed and score_mode == SCORE_AWARD:
+        student_score = award_module_score(db, user_id, module)
+    elif progress.completed and score_mode == SCORE_REPORT:
+        student_score = next(iter(score_events.current_scores(db, user_id, [module.id])), None)
+
+    try:
+        db.flush()
+        # Built before the commit so nothing has to be reloaded afterwards
+        result = {
+            "id": module.id,
+            "name": module.name,
+            "description": module.description,
+            "background_image": module.background_image,
+            "course_id": module.course_id,
+            "user_progress": {
+                "locked": progress.locked,
+                "completed": progress.completed,
+                "last_accessed": progress.last_accessed.isoformat() if progress.last_accessed else None
+            }
+        }
+        if student_score is not None:
+            result["score"] = {**student_score, "completed_at": student_score["completed_at"].isoformat()}
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
+# ==================== ACTIVITY SYNC ====================
+
+class CompletionRace(Exception):
+    """Another request completed one of the batch's activities first; the batch was rolled back"""
+
+def client_time(value: Optional[datetime], now: datetime) -> datetime:
+    """A tablet's timestamp as naive UTC, never later than now (tablet clocks drift)"""
+    if value is None:
+        return now
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(value, now)
+
+def apply_activity_completions(db: Session, user_id: int, completions: list) -> dict:
+    """Apply activity completions queued on a tablet while it was offline.
+
+    completions are dicts with activity_name, score and completed_at (the
+    client's timestamp, or None). They are applied oldest first; an
+    activity already completed, or repeated later in the batch, is
+    reported and skipped. The statement count does not depend on the
+    batch size: names resolve from catalog_cache.activities, one SELECT
+    loads the user's progress rows, then one INSERT and one UPDATE for
+    progress, the score statements of score_events.add_scores for all
+    modules at once, and a single COMMIT. Returns per-item results in
+    request order plus the new module totals.
+
+    The progress rows are locked FOR UPDATE where the database supports
+    it, and the UPDATE only flips rows that are not completed yet. If a
+    concurrent request completed any of them first, the batch is rolled
+    back and CompletionRace raised; a second call reports those
+    activities as already_completed. A new row another request inserted
+    first fails the same way with IntegrityError.
+    """
+    now = datetime.utcnow()
+    activities = catalog_cache.activities.resolve_many(db, [item["activity_name"] for item in completions])
+
+    progress = {}
+    if activities:
+        for row in db.execute(
+            select(UserActivityProgress.id, UserActivityProgress.activity_id, UserActivityProgress.completed)
+            .where(UserActivityProgress.user_id == user_id,
+                   UserActivityProgress.activity_id.in_([a.activity_id for a in activities.values()]))
+            .with_for_update()
+        ):
+            if row.activity_id not in progress or row.completed:
+                progress[row.activity_id] = row
+
+    results = [None] * len(completions)
+    applied = set()
+    inserts, updates = [], []
+    deltas, completed_at = {}, {}
+    order = sorted(range(len(completions)),
+                   key=lambda i: (client_time(completions[i]["completed_at"], now), i))
+    for i in order:
+        item = completions[i]
+        result = {"activity": item["activity_name"], "status": "completed", "score_added": 0}
+        results[i] = result
+        activity = activities.get(activity_key(item["activity_name"]))
+        if activity is None:
+            result["status"] = "not_found"
+            continue
+        if activity.activity_id in applied:
+            result["status"] = "duplicate"
+            continue
+        existing = progress.get(activity.activity_id)
+        if existing is not None and existing.completed:
+            result["status"] = "already_completed"
+            continue
+        applied.add(activity.activity_id)
+        if existing is None:
+            inserts.append({"user_id": user_id, "activity_id": activity.activity_id, "completed": True})
+        else:
+            updates.append(existing.id)
+        result["score_added"] = item["score"]
+        deltas[activity.module_id] = deltas.get(activity.module_id, 0) + item["score"]
+        completed_at[activity.module_id] = client_time(item["completed_at"], now)
+
+    try:
+        if inserts:
+            db.execute(insert(UserActivityProgress), inserts)
+        if updates:
+            flipped = db.execute(update(UserActivityProgress)
+                                 .where(UserActivityProgress.id.in_(updates),
+                                        UserActivityProgress.completed.is_not(True))
+                                 .values(completed=True)).rowcount
+            if flipped != len(updates):
+                raise CompletionRace()
+        scores = score_events.add_scores(db, user_id, deltas, completed_at)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "results": results,
+        "completed": len(applied),
+        "scores": [{"module_id": score["module_id"], "total_score": score["total_score"]} for score in scores],
+    }
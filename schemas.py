@@ -1,6 +1,6 @@
 # schemas.py - Pydantic schemas for API validation
 
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -263,6 +263,22 @@ class ModuleResponse(BaseModel):
     class Config:
         orm_mode = True
 
+# ==================== COURSE TREE SCHEMAS ====================
+# Levels below the requested depth are unset and left out of the response
+
+class ResourceTree(ResourceSimple):
+    videos: Optional[List[Video]] = None
+    pdfs: Optional[List[PDF]] = None
+    activities: Optional[List[Activity]] = None
+
+class ModuleTree(ModuleSimple):
+    resources: Optional[List[ResourceTree]] = None
+
+class CourseTree(CourseSimple):
+    description: Optional[str] = None
+    background_image: Optional[str] = None
+    modules: Optional[List[ModuleTree]] = None
+
 class CourseWithProgress(CourseBase):
     model_config = ConfigDict(from_attributes=True)
     id: int
@@ -275,7 +291,7 @@ class CourseWithProgress(CourseBase):
     }
     #=========================StudentScore==========================
 class StudentScore(BaseModel):
-    id: int
+    id: Optional[int] = None  # None while the score only exists as pending score events
     user_id: int
     module_id: int
     total_score: float
@@ -286,9 +302,22 @@ class StudentScore(BaseModel):
 class SpellCheckRequest(BaseModel):
     text: str
 
+class TranslateBatchRequest(BaseModel):
+    texts: List[str] = Field(..., max_length=500)
+    src: str = "en"
+    dest: str = "ta"
+
 class CompleteActivityRequest(BaseModel):
     score:int
 
+class ActivityCompletion(BaseModel):
+    activity_name: str
+    score: int
+    completed_at: Optional[datetime] = None  # when the tablet recorded it
+
+class ActivityCompletionBatch(BaseModel):
+    completions: List[ActivityCompletion] = Field(..., max_length=500)
+
 class ActivityWithCompletion(BaseModel):
     id: int
     name: str
@@ -0,0 +1,230 @@
+# score_events.py - write-behind score log, folded into student_scores and user_total_scores in batches
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, cast, func, insert, null, select, union_all, update
+from sqlalchemy.orm import Session
+
+import crud
+from models import ScoreEvent, StudentScore, TableCounter
+
+# Score endpoints append to score_events instead of upserting student_scores
+SCORE_WRITE_BEHIND = os.getenv("SCORE_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+SCORE_AGGREGATE_SECONDS = float(os.getenv("SCORE_AGGREGATE_SECONDS", "2"))
+SCORE_AGGREGATE_BATCH = int(os.getenv("SCORE_AGGREGATE_BATCH", "5000"))
+# (user, module) groups per upsert statement and ids per claiming UPDATE; keeps SQLite under its bound-parameter limit
+SCORE_UPSERT_CHUNK = 1000
+# Earlier versions kept the highest folded event id here instead of stamping folded_at
+WATERMARK_COUNTER = "score_events_aggregated"
+
+
+def retire_watermark(db: Session) -> int:
+    """Mark events an earlier, watermark-based aggregator already folded, and drop its watermark row.
+
+    Pending events are the ones with no folded_at; without this, rows at or
+    below the old watermark would be counted again. Safe to run on every start.
+    """
+    counter = db.get(TableCounter, WATERMARK_COUNTER, with_for_update=True)
+    if counter is None:
+        db.rollback()
+        return 0
+    marked = db.execute(
+        update(ScoreEvent)
+        .where(ScoreEvent.id <= counter.value, ScoreEvent.folded_at.is_(None))
+        .values(folded_at=datetime.utcnow())
+    ).rowcount
+    db.delete(counter)
+    db.commit()
+    print(f"Score events: marked {marked} events folded before the watermark was retired")
+    return marked
+
+
+# ==================== WRITES ====================
+
+def record(db: Session, user_id: int, deltas: Dict[int, float]):
+    """Append one event per module_id -> delta (not committed)"""
+    now = datetime.utcnow()
+    db.execute(insert(ScoreEvent), [
+        {"user_id": user_id, "module_id": module_id, "delta": float(delta), "created_at": now}
+        for module_id, delta in deltas.items()
+    ])
+
+def add_scores(db: Session, user_id: int, deltas: Dict[int, float],
+               completed_at: Optional[Dict[int, datetime]] = None) -> List[dict]:
+    """Apply module_id -> delta score changes and return the user's new scores for those modules.
+
+    With write-behind on this appends events and reads the totals back with
+    the pending events merged in; otherwise it upserts student_scores
+    directly. Not committed either way.
+    """
+    if not deltas:
+        return []
+    if SCORE_WRITE_BEHIND:
+        record(db, user_id, deltas)
+        return current_scores(db, user_id, list(deltas))
+    rows = crud.add_scores(db, user_id, deltas, completed_at)
+    return [score_dict(user_id, row) for row in rows]
+
+def add_score(db: Session, user_id: int, module_id: int, delta: float) -> dict:
+    return add_scores(db, user_id, {module_id: delta})[0]
+
+
+# ==================== FRESH READS ====================
+
+def score_dict(user_id: int, row) -> dict:
+    return {
+        "id": row.id,  # None until the aggregator has created the student_scores row
+        "user_id": user_id,
+        "module_id": row.module_id,
+        "total_score": row.total_score,
+        "completed_at": row.completed_at,
+    }
+
+def current_scores(db: Session, user_id: int, module_ids: Optional[List[int]] = None) -> List[dict]:
+    """The user's student_scores with not-yet-aggregated events added.
+
+    Stored rows and pending events are read in one statement, and a pass
+    marks the events it folds in the same transaction, so an aggregator
+    pass committing in between cannot count an event twice or drop it.
+    """
+    stored = select(
+        StudentScore.module_id,
+        StudentScore.id.label("score_id"),
+        StudentScore.total_score.label("amount"),
+        StudentScore.completed_at.label("at"),
+    ).where(StudentScore.user_id == user_id)
+    pending = select(
+        ScoreEvent.module_id,
+        cast(null(), Integer).label("score_id"),
+        ScoreEvent.delta.label("amount"),
+        ScoreEvent.created_at.label("at"),
+    ).where(ScoreEvent.user_id == user_id, ScoreEvent.folded_at.is_(None))
+    if module_ids is not None:
+        stored = stored.where(StudentScore.module_id.in_(module_ids))
+        pending = pending.where(ScoreEvent.module_id.in_(module_ids))
+    both = union_all(stored, pending).subquery()
+    rows = db.execute(
+        select(
+            both.c.module_id,
+            func.max(both.c.score_id).label("id"),
+            func.coalesce(func.sum(both.c.amount), 0.0).label("total_score"),
+            func.max(both.c.at).label("completed_at"),
+        )
+        .group_by(both.c.module_id)
+        .order_by(both.c.module_id)
+    ).all()
+    return [score_dict(user_id, row) for row in rows]
+
+def current_total(db: Session, user_id: int) -> float:
+    """The user's total score including pending events"""
+    return sum(score["total_score"] or 0.0 for score in current_scores(db, user_id))
+
+
+# ==================== AGGREGATION ====================
+
+def aggregate(db: Session, batch_size: int = SCORE_AGGREGATE_BATCH) -> dict:
+    """Fold the oldest batch of pending events into student_scores and user_total_scores.
+
+    The batch is claimed by setting folded_at on its events in the same
+    transaction as the upserts; the events stay in the table as history.
+    Ids and clocks play no part: an event whose transaction is still open
+    is simply not in this batch and is folded by a later pass. If a
+    concurrent pass (one per worker) claimed any of the same events first,
+    this pass rolls back and folds nothing. Returns {"events": folded}.
+    """
+    events = db.execute(
+        select(ScoreEvent.id, ScoreEvent.user_id, ScoreEvent.module_id, ScoreEvent.delta, ScoreEvent.created_at)
+        .where(ScoreEvent.folded_at.is_(None))
+        .order_by(ScoreEvent.id)
+        .limit(batch_size)
+    ).all()
+    if not events:
+        db.rollback()
+        return {"events": 0}
+
+    ids = [event.id for event in events]
+    folded_at = datetime.utcnow()
+    claimed = 0
+    for i in range(0, len(ids), SCORE_UPSERT_CHUNK):
+        claimed += db.execute(
+            update(ScoreEvent)
+            .where(ScoreEvent.id.in_(ids[i:i + SCORE_UPSERT_CHUNK]), ScoreEvent.folded_at.is_(None))
+            .values(folded_at=folded_at)
+        ).rowcount
+    if claimed != len(ids):
+        # Another worker folded some of these first
+        db.rollback()
+        return {"events": 0}
+
+    groups = {}
+    for event in events:
+        group = groups.setdefault((event.user_id, event.module_id), {
+            "user_id": event.user_id, "module_id": event.module_id,
+            "total_score": 0.0, "completed_at": event.created_at,
+        })
+        group["total_score"] += event.delta
+        group["completed_at"] = max(group["completed_at"], event.created_at)
+    rows = list(groups.values())
+    for i in range(0, len(rows), SCORE_UPSERT_CHUNK):
+        crud.apply_score_deltas(db, rows[i:i + SCORE_UPSERT_CHUNK])
+    db.commit()
+    return {"events": len(events)}
+
+
+class Aggregator:
+    """Runs aggregate() until caught up and keeps numbers for /admin/score-events"""
+
+    def __init__(self, batch_size: int = SCORE_AGGREGATE_BATCH):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.passes = 0
+        self.events = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_seconds = None
+
+    def drain(self, db: Session) -> dict:
+        """Fold batches until a short one; one pass at a time per process"""
+        with self._lock:
+            started = time.perf_counter()
+            folded = 0
+            try:
+                while True:
+                    result = aggregate(db, self.batch_size)
+                    self.passes += 1
+                    folded += result["events"]
+                    if result["events"] < self.batch_size:
+                        break
+            except Exception:
+                self.failures += 1
+                db.rollback()
+                raise
+            finally:
+                self.events += folded
+                self.last_run_at = datetime.utcnow()
+                self.last_seconds = time.perf_counter() - started
+            return {"events": folded}
+
+    def stats(self, db: Session) -> dict:
+        pending = db.execute(
+            select(func.count(), func.min(ScoreEvent.created_at)).where(ScoreEvent.folded_at.is_(None))
+        ).one()
+        oldest = pending[1]
+        return {
+            "write_behind": SCORE_WRITE_BEHIND,
+            "interval_seconds": SCORE_AGGREGATE_SECONDS,
+            "pending_events": pending[0],
+            "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+            "passes": self.passes,
+            "events_folded": self.events,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": round(self.last_seconds * 1000, 2) if self.last_seconds is not None else None,
+        }
+
+
+aggregator = Aggregator()
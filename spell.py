@@ -1,26 +1,310 @@
-from textblob import TextBlob
-from spellchecker import SpellChecker
+# spell.py - spellcheck over a prebuilt symmetric-delete index, shared by all requests
 
-# Input text with mistakes
-text = "Ths is an exampel of splling corection"
+import functools
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
 
-# Step 1: TextBlob for best correction
-blob = TextBlob(text)
-best_correction = blob.correct()
+SPELL_DICTIONARY = os.getenv("SPELL_DICTIONARY")  # word -> count JSON (optionally .gz)
+# Plain JSON, never pickle: whoever can write this file must not be able to run code at startup
+SPELL_INDEX_PATH = os.getenv("SPELL_INDEX_PATH", "spell_index.json")
+SPELL_MAX_EDIT_DISTANCE = int(os.getenv("SPELL_MAX_EDIT_DISTANCE", "2"))
+SPELL_PREFIX_LENGTH = int(os.getenv("SPELL_PREFIX_LENGTH", "7"))
+# Only the most frequent words are indexed as suggestions; every dictionary word still counts as known
+SPELL_MAX_WORDS = int(os.getenv("SPELL_MAX_WORDS", "50000"))
+SPELL_MAX_SUGGESTIONS = 5
+# Suggestions for recently seen misspellings; children repeat the same ones a lot
+SPELL_CACHE_SIZE = int(os.getenv("SPELL_CACHE_SIZE", "20000"))
 
-# Step 2: PySpellChecker for multiple suggestions
-spell = SpellChecker()
+INDEX_FORMAT = 2
+WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
 
-# Find misspelled words
-misspelled = spell.unknown(text.split())
 
-suggestions = {}
-for word in misspelled:
-    suggestions[word] = spell.candidates(word)  # Get multiple possible corrections
+class SpellcheckUnavailable(Exception):
+    """Raised when no dictionary could be loaded"""
 
-# Output results
-print("Original Text: ", text)
-print("Best Correction: ", best_correction)
-print("\nSuggestions for each wrong word:")
-for wrong, sugg in suggestions.items():
-    print(f"{wrong} → {', '.join(sugg)}")
+
+def default_dictionary_path() -> str:
+    """The English frequency list bundled with pyspellchecker"""
+    if SPELL_DICTIONARY:
+        return SPELL_DICTIONARY
+    try:
+        import spellchecker
+    except ImportError:
+        raise SpellcheckUnavailable("Set SPELL_DICTIONARY or install pyspellchecker")
+    return os.path.join(os.path.dirname(spellchecker.__file__), "resources", "en.json.gz")
+
+def load_frequencies(path: str) -> Dict[str, int]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return {word.lower(): int(count) for word, count in json.load(f).items()}
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 once it is known to be larger.
+
+    Only the diagonal band |i - j| <= max_distance is filled in, after
+    stripping the common prefix and suffix, so a check costs a few dozen
+    cells rather than len(a) * len(b).
+    """
+    too_far = max_distance + 1
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return too_far
+    start = 0
+    while start < len_a and start < len_b and a[start] == b[start]:
+        start += 1
+    while len_a > start and len_b > start and a[len_a - 1] == b[len_b - 1]:
+        len_a -= 1
+        len_b -= 1
+    a, b = a[start:len_a], b[start:len_b]
+    len_a -= start
+    len_b -= start
+    if not len_a or not len_b:
+        return min(len_a or len_b, too_far)
+
+    previous2 = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        char = a[i - 1]
+        current = [too_far] * (len_b + 1)
+        current[0] = i
+        low, high = max(1, i - max_distance), min(len_b, i + max_distance)
+        row_min = i if low == 1 else too_far
+        for j in range(low, high + 1):
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if previous2 is not None and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]:
+                if previous2[j - 2] + 1 < value:
+                    value = previous2[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return too_far
+        previous2, previous = previous, current
+    return min(previous[len_b], too_far)
+
+def match_case(original: str, word: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return word.upper()
+    if original[0].isupper():
+        return word[0].upper() + word[1:]
+    return word
+
+
+class SpellIndex:
+    """Symmetric-delete candidate index (SymSpell).
+
+    Every dictionary word is stored under each string obtained by deleting
+    up to max_distance characters from its first prefix_length letters. A
+    lookup generates the same deletes for the query and only computes real
+    edit distances for the handful of words found under them, instead of
+    trying every possible edit against the whole dictionary.
+    """
+
+    def __init__(self, frequencies: Dict[str, int], max_distance: int = SPELL_MAX_EDIT_DISTANCE,
+                 prefix_length: int = SPELL_PREFIX_LENGTH, max_words: int = SPELL_MAX_WORDS):
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.max_words = max_words
+        self.words: List[str] = sorted(frequencies, key=frequencies.get, reverse=True)[:max_words]
+        self.deletes: Dict[str, List[int]] = {}
+        for word_id, word in enumerate(self.words):
+            for delete in self._deletes(word[:prefix_length]):
+                self.deletes.setdefault(delete, []).append(word_id)
+
+    def to_json(self) -> dict:
+        return {"settings": list(self.settings()), "frequencies": self.frequencies,
+                "words": self.words, "deletes": self.deletes}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "SpellIndex":
+        """Rebuild an index saved by to_json(); raises ValueError if the data doesn't fit"""
+        index = cls.__new__(cls)
+        _, index.max_distance, index.prefix_length, index.max_words = data["settings"]
+        index.frequencies = data["frequencies"]
+        index.words = data["words"]
+        index.deletes = data["deletes"]
+        if not all(isinstance(part, container) for part, container in
+                   ((index.frequencies, dict), (index.words, list), (index.deletes, dict))):
+            raise ValueError("Bad spell index layout")
+        return index
+
+    def _deletes(self, word: str) -> set:
+        found = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {item[:i] + item[i + 1:] for item in frontier for i in range(len(item))}
+            found |= frontier
+        return found
+
+    def known(self, word: str) -> bool:
+        return word.lower() in self.frequencies
+
+    def candidates(self, word: str, limit: int = SPELL_MAX_SUGGESTIONS) -> List[str]:
+        """Closest indexed words, nearest first then most frequent.
+
+        Query deletes are visited one deletion level at a time. A word found
+        at level k is at least k edits away, so once ``limit`` suggestions
+        within distance d are in hand, deeper levels and longer distances
+        are skipped.
+        """
+        word = word.lower()
+        bound = self.max_distance
+        seen = set()
+        scored = []
+        level = {word[:self.prefix_length]}
+        for deleted in range(self.max_distance + 1):
+            if deleted > bound:
+                break
+            for delete in level:
+                for word_id in self.deletes.get(delete, ()):
+                    if word_id in seen:
+                        continue
+                    seen.add(word_id)
+                    candidate = self.words[word_id]
+                    if abs(len(candidate) - len(word)) > bound:
+                        continue
+                    distance = edit_distance(word, candidate, bound)
+                    if distance > bound:
+                        continue
+                    scored.append((distance, -self.frequencies[candidate], candidate))
+                    if len(scored) >= limit:
+                        scored.sort()
+                        del scored[limit:]
+                        bound = scored[-1][0]
+            level = {item[:i] + item[i + 1:] for item in level for i in range(len(item))}
+        scored.sort()
+        return [candidate for _, _, candidate in scored[:limit]]
+
+    def settings(self) -> tuple:
+        return (INDEX_FORMAT, self.max_distance, self.prefix_length, self.max_words)
+
+
+# ==================== SERVICE ====================
+
+class SpellService:
+    """Loads (or builds and saves) the index once; read-only afterwards"""
+
+    def __init__(self, index_path: str = SPELL_INDEX_PATH):
+        self.index_path = index_path
+        self.index: Optional[SpellIndex] = None
+        self._candidates = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.loaded_from = None
+        self.words_checked = 0
+        self.lookup_seconds = 0.0
+
+    def _wanted_settings(self) -> tuple:
+        return (INDEX_FORMAT, SPELL_MAX_EDIT_DISTANCE, SPELL_PREFIX_LENGTH, SPELL_MAX_WORDS)
+
+    def _load_saved(self, dictionary_path: str) -> Optional[SpellIndex]:
+        try:
+            if os.path.getmtime(self.index_path) < os.path.getmtime(dictionary_path):
+                return None
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if tuple(data["settings"]) != self._wanted_settings():
+                return None
+            return SpellIndex.from_json(data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, index: SpellIndex):
+        # Written under a temp name and renamed so a worker never reads half a file
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".spell-", suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index.to_json(), f, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print("Could not save spell index:", e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self) -> SpellIndex:
+        """Load the saved index, or build it from the dictionary and save it (blocking)"""
+        with self._lock:
+            if self.index is not None:
+                return self.index
+            started = time.perf_counter()
+            dictionary_path = default_dictionary_path()
+            index = self._load_saved(dictionary_path)
+            self.loaded_from = self.index_path
+            if index is None:
+                index = SpellIndex(load_frequencies(dictionary_path))
+                self._save(index)
+                self.loaded_from = dictionary_path
+            self.load_seconds = time.perf_counter() - started
+            self._candidates = functools.lru_cache(maxsize=SPELL_CACHE_SIZE)(index.candidates)
+            self.index = index
+            return index
+
+    def check(self, text: str) -> dict:
+        """Best correction for the whole text plus suggestions for each unknown word"""
+        index = self.index or self.load()
+        started = time.perf_counter()
+        suggestions = {}
+        corrections = {}
+        words = 0
+        for match in WORD_RE.finditer(text):
+            words += 1
+            word = match.group()
+            if word in suggestions or index.known(word):
+                continue
+            candidates = self._candidates(word.lower())
+            suggestions[word] = candidates
+            if candidates:
+                corrections[word] = match_case(word, candidates[0])
+        best_correction = WORD_RE.sub(lambda m: corrections.get(m.group(), m.group()), text)
+        self.words_checked += words
+        self.lookup_seconds += time.perf_counter() - started
+        return {
+            "original_text": text,
+            "best_correction": best_correction,
+            "suggestions": suggestions
+        }
+
+    def check_many(self, texts: List[str]) -> List[dict]:
+        return [self.check(text) for text in texts]
+
+    def stats(self) -> dict:
+        index = self.index
+        return {
+            "loaded": index is not None,
+            "loaded_from": self.loaded_from,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "dictionary_words": len(index.frequencies) if index else 0,
+            "indexed_words": len(index.words) if index else 0,
+            "delete_keys": len(index.deletes) if index else 0,
+            "words_checked": self.words_checked,
+            "suggestion_cache_hits": self._candidates.cache_info().hits if self._candidates else 0,
+            "suggestion_cache_misses": self._candidates.cache_info().misses if self._candidates else 0,
+            "avg_us_per_word": round(self.lookup_seconds / self.words_checked * 1e6, 1) if self.words_checked else 0.0,
+        }
+
+
+service = SpellService()
+
+
+if __name__ == "__main__":
+    # python spell.py build - prebuild the index file so workers start from it
+    import sys
+
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python spell.py build")
+    if os.path.exists(SPELL_INDEX_PATH):
+        os.remove(SPELL_INDEX_PATH)
+    service.load()
+    print(service.stats())
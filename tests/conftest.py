@@ -0,0 +1,62 @@
+# conftest.py - shared fixtures: the app on a throwaway SQLite database seeded with benchmarks.dataset
+#
+# main.py creates its tables and mounts videos/ and pdf/ from the working
+# directory at import, so this points the app at a temp directory before
+# any test module imports it.
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+TEST_DIR = tempfile.mkdtemp(prefix="lms-tests-")
+for folder in ("videos", "pdf", "uploads"):
+    os.makedirs(os.path.join(TEST_DIR, folder), exist_ok=True)
+os.chdir(TEST_DIR)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("SPELL_INDEX_PATH", os.path.join(TEST_DIR, "spell_index.json"))
+os.environ.setdefault("TRANSLATION_MEMORY_PATH", os.path.join(TEST_DIR, "translation_memory.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dataset import Dataset, create_schema  # noqa: E402
+import database  # noqa: E402
+
+
+@contextmanager
+def count_statements(engine=database.engine):
+    """Collect every statement sent through ``engine`` inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """A small school: 2 courses of 3 modules, 4 resources per module, 5 activities per resource"""
+    data = Dataset(students=5, courses=2, modules_per_course=3, uploads=0)
+    create_schema(database.engine)
+    with database.SessionLocal() as db:
+        data.seed(db)
+    return data
+
+
+@pytest.fixture
+def db(dataset):
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
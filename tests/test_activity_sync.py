@@ -0,0 +1,79 @@
+# test_activity_sync.py - replaying an offline batch awards its scores once, even when two replays overlap
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+import main
+import progress
+import schemas
+import score_events
+from models import User, UserActivityProgress
+
+USER_ID = 3
+MODULE_ID = 5  # activities 81..100, no seeded progress
+
+
+def module_score(db) -> float:
+    return next(iter(score_events.current_scores(db, USER_ID, [MODULE_ID])), {"total_score": 0.0})["total_score"]
+
+
+def prepare(db, started: list, new: list) -> schemas.ActivityCompletionBatch:
+    """Incomplete progress rows for ``started``, none for ``new``; a batch completing both for 2 points each"""
+    db.query(UserActivityProgress).filter(
+        UserActivityProgress.user_id == USER_ID, UserActivityProgress.activity_id.in_(started + new)
+    ).delete(synchronize_session=False)
+    db.add_all(UserActivityProgress(user_id=USER_ID, activity_id=a, completed=False) for a in started)
+    db.commit()
+    return schemas.ActivityCompletionBatch(completions=[
+        {"activity_name": f"Activity {a}", "score": 2} for a in started + new
+    ])
+
+
+def replay(batch: schemas.ActivityCompletionBatch) -> dict:
+    db = database.SessionLocal()
+    try:
+        return main.complete_activities_batch(batch, db, db.get(User, USER_ID))
+    finally:
+        db.close()
+
+
+def test_replayed_batch_awards_once(db):
+    batch = prepare(db, [81, 82], [83])
+    before = module_score(db)
+
+    first, second = replay(batch), replay(batch)
+
+    assert [r["status"] for r in first["results"]] == ["completed"] * 3
+    assert [r["status"] for r in second["results"]] == ["already_completed"] * 3
+    db.expire_all()
+    assert module_score(db) == before + 6
+
+
+@pytest.mark.parametrize("started, new", [([84, 85], []), ([86], [87])])
+def test_overlapping_replays_award_once(db, monkeypatch, started, new):
+    batch = prepare(db, started, new)
+    before = module_score(db)
+
+    # Hold both replays after their progress SELECT until both have read the rows
+    both_read = threading.Barrier(2)
+    waited = threading.local()
+    client_time = progress.client_time
+
+    def after_select(value, now):
+        if not getattr(waited, "done", False):
+            waited.done = True
+            both_read.wait(timeout=10)
+        return client_time(value, now)
+
+    monkeypatch.setattr(progress, "client_time", after_select)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(replay, [batch, batch]))
+
+    statuses = sorted([r["status"] for r in result["results"]] for result in results)
+    count = len(started + new)
+    assert statuses == [["already_completed"] * count, ["completed"] * count]
+    db.expire_all()
+    assert module_score(db) == before + 2 * count
@@ -0,0 +1,79 @@
+# test_course_tree.py - /courses/{id}/tree and /resources/{id}/complete load everything they serve up front
+#
+# The endpoints run on a session that adds raiseload("*") to every ORM
+# query, including the selectin loads, so serializing a relationship the
+# query did not load fails instead of quietly running a query per row.
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import raiseload
+
+from auth import create_access_token
+from conftest import count_statements
+import catalog_cache
+import crud
+import database
+import main
+
+# Queries per depth: course, modules, resources, then videos + pdfs + activities
+TREE_QUERIES = {0: 1, 1: 2, 2: 3, 3: 6}
+# resource, videos, pdfs, activities
+RESOURCE_QUERIES = 4
+
+
+def strict_db():
+    db = database.SessionLocal()
+
+    @event.listens_for(db, "do_orm_execute")
+    def raise_on_lazy_load(state):
+        if state.is_select:
+            state.statement = state.statement.options(raiseload("*"))
+
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(dataset, monkeypatch):
+    main.app.dependency_overrides[main.get_db] = strict_db
+    # Read the catalog version once up front so every request counts only its own loads
+    monkeypatch.setattr(catalog_cache.version, "poll_seconds", 3600)
+    with database.SessionLocal() as db:
+        catalog_cache.version.invalidate()
+        catalog_cache.version.current(db)
+    catalog_cache.cache.clear()
+    try:
+        # The catalog reads are public, but the middleware still wants a session cookie
+        yield TestClient(main.app, cookies={"access_token": create_access_token({"sub": dataset.student_email(1)})})
+    finally:
+        main.app.dependency_overrides.pop(main.get_db, None)
+        catalog_cache.cache.clear()
+
+
+@pytest.mark.parametrize("depth", range(crud.COURSE_TREE_MAX_DEPTH + 1))
+def test_course_tree(client, dataset, depth):
+    with count_statements() as statements:
+        response = client.get("/courses/1/tree", params={"depth": depth})
+    assert response.status_code == 200
+    assert len(statements) == TREE_QUERIES[depth]
+
+    tree = response.json()
+    if depth >= 1:
+        assert [m["id"] for m in tree["modules"]] == dataset.course_modules(1)
+    else:
+        assert "modules" not in tree
+    if depth >= 3:
+        resource = tree["modules"][0]["resources"][0]
+        assert [a["id"] for a in resource["activities"]] == list(range(1, dataset.activities_per_resource + 1))
+        assert len(resource["videos"]) == len(resource["pdfs"]) == 1
+
+
+def test_resource_with_content(client, dataset):
+    with count_statements() as statements:
+        response = client.get("/resources/1/complete")
+    assert response.status_code == 200
+    assert len(statements) == RESOURCE_QUERIES
+    assert len(response.json()["activities"]) == dataset.activities_per_resource
@@ -0,0 +1,40 @@
+# test_login.py - the login token names the stored account, also when the login re-hashes its password
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+import auth
+import crud
+import hashing
+import main
+from models import User
+
+EMAIL = "login@example.com"
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def client(db):
+    if crud.get_user_by_email(db, EMAIL) is None:
+        crud.create_user(db, EMAIL, PASSWORD)
+    main.start_hashing_pool()
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.stop_hashing_pool()
+
+
+def test_token_subject_is_the_stored_email_after_a_rehash(client, db, monkeypatch):
+    # As on MySQL's default collation, where = on email ignores case
+    monkeypatch.setattr(crud, "get_user_by_email",
+                        lambda db, email: db.query(User).filter(func.lower(User.email) == email.lower()).first())
+    monkeypatch.setattr(hashing, "needs_rehash", lambda password_hash: True)
+    before = db.query(User.password).filter_by(email=EMAIL).scalar()
+
+    response = client.post("/login", json={"email": EMAIL.upper(), "password": PASSWORD})
+
+    assert response.status_code == 200
+    assert auth.verify_token(response.json()["cookie"])["sub"] == EMAIL
+    db.expire_all()
+    assert db.query(User.password).filter_by(email=EMAIL).scalar() != before
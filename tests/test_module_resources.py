@@ -0,0 +1,59 @@
+# test_module_resources.py - crud.get_full_resources_by_module runs a fixed number of queries
+
+from typing import List
+
+from pydantic import TypeAdapter
+
+from conftest import count_statements
+import crud
+import schemas
+from models import Activity, Module, PDF, Resource, Video
+
+# resources, videos, pdfs, activities, the user's completed activities
+MODULE_RESOURCES_QUERIES = 5
+
+
+def add_module(db, course_id: int, resources: int, activities_per_resource: int) -> int:
+    module = Module(name="Extra", description="", background_image="", course_id=course_id)
+    db.add(module)
+    db.flush()
+    for r in range(resources):
+        resource = Resource(name=f"Extra {r}", module_id=module.id)
+        db.add(resource)
+        db.flush()
+        db.add(Video(title="v", url="videos/v.mp4", resource_id=resource.id))
+        db.add(PDF(title="p", url="pdf/p.pdf", resource_id=resource.id))
+        db.add_all(Activity(name=f"Extra {module.id}.{r}.{a}", resource_id=resource.id)
+                   for a in range(activities_per_resource))
+    db.flush()
+    return module.id
+
+
+def load(db, module_id: int, user_id: int = 1):
+    db.expire_all()
+    with count_statements() as statements:
+        # Validated as the endpoint's response_model, so lazy loads would be counted too
+        resources = TypeAdapter(List[schemas.Resource]).validate_python(
+            crud.get_full_resources_by_module(db, module_id, user_id), from_attributes=True
+        )
+    return resources, statements
+
+
+def test_query_count_does_not_grow_with_module_size(db):
+    small = add_module(db, course_id=1, resources=1, activities_per_resource=1)
+    large = add_module(db, course_id=1, resources=25, activities_per_resource=8)
+
+    small_resources, small_statements = load(db, small)
+    large_resources, large_statements = load(db, large)
+
+    assert len(small_resources) == 1
+    assert len(large_resources) == 25
+    assert len(small_statements) == len(large_statements) == MODULE_RESOURCES_QUERIES
+
+
+def test_completed_activities_are_marked(db, dataset):
+    # Every seeded student has completed the first ten activities, all in module 1
+    resources, statements = load(db, module_id=1)
+    completed = {a.id for r in resources for a in r.activities if a.completed}
+    assert completed == set(range(1, 11))
+    assert len(statements) == MODULE_RESOURCES_QUERIES
@@ -0,0 +1,19 @@
+# test_query_plans.py - new full scans or sorts, and plan changes not in the snapshot, fail the suite
+#
+# benchmarks.query_plans seeds its own school from scratch and needs
+# database.py's engines built for that database, so it runs in a fresh
+# interpreter on a temp SQLite file rather than on this session's test.db.
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_query_plans_match_the_snapshot():
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("DATABASE_URL", "SPELL_INDEX_PATH", "TRANSLATION_MEMORY_PATH")}
+    check = subprocess.run([sys.executable, "-m", "benchmarks.query_plans"], cwd=ROOT, env=env,
+                           capture_output=True, text=True, timeout=600)
+    assert check.returncode == 0, check.stdout[-5000:] + check.stderr[-2000:]
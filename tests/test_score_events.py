@@ -0,0 +1,62 @@
+# test_score_events.py - write-behind scores: every event is folded exactly once, whatever order ids commit in
+
+from sqlalchemy import func, insert
+
+import score_events
+from models import ScoreEvent, StudentScore, TableCounter, UserTotalScore
+
+MODULE_ID = 6  # no seeded scores
+
+
+def stored(db, user_id: int) -> tuple:
+    score = db.query(StudentScore.total_score).filter_by(user_id=user_id, module_id=MODULE_ID).scalar()
+    total = db.query(UserTotalScore.total_score).filter_by(user_id=user_id).scalar()
+    return score, total
+
+
+def add_event(db, user_id: int, delta: float, event_id: int = None):
+    row = {"user_id": user_id, "module_id": MODULE_ID, "delta": delta}
+    if event_id is not None:
+        row["id"] = event_id
+    db.execute(insert(ScoreEvent), [row])
+    db.commit()
+
+
+def drain(db):
+    while score_events.aggregate(db)["events"]:
+        pass
+    assert db.query(func.count(ScoreEvent.id)).filter(ScoreEvent.folded_at.is_(None)).scalar() == 0
+
+
+def test_event_committed_after_a_higher_id_is_still_folded(db):
+    drain(db)
+    _, total_before = stored(db, 4)
+    # A higher id commits and is folded before a lower one that was still in flight
+    add_event(db, 4, 5.0, event_id=1_000_000)
+    drain(db)
+    add_event(db, 4, 3.0, event_id=999_999)
+    assert score_events.current_scores(db, 4, [MODULE_ID])[0]["total_score"] == 8.0
+    drain(db)
+
+    assert stored(db, 4) == (8.0, total_before + 8.0)
+    assert score_events.current_scores(db, 4, [MODULE_ID])[0]["total_score"] == 8.0
+    # Folded events stay as history
+    kept = db.query(ScoreEvent.delta).filter(ScoreEvent.id.in_([999_999, 1_000_000])).order_by(ScoreEvent.id)
+    assert [delta for (delta,) in kept] == [3.0, 5.0]
+
+
+def test_retire_watermark_marks_events_already_folded(db):
+    drain(db)
+    _, total_before = stored(db, 5)
+    add_event(db, 5, 2.0)
+    folded_id = db.query(func.max(ScoreEvent.id)).scalar()
+    db.add(TableCounter(name=score_events.WATERMARK_COUNTER, value=folded_id))
+    db.commit()
+    add_event(db, 5, 7.0)
+
+    assert score_events.retire_watermark(db) == 1
+    assert db.get(TableCounter, score_events.WATERMARK_COUNTER) is None
+    drain(db)
+    assert stored(db, 5) == (7.0, total_before + 7.0)
+    assert db.get(ScoreEvent, folded_id).folded_at is not None
+    assert score_events.retire_watermark(db) == 0
@@ -0,0 +1,50 @@
+# test_scores.py - score increments add up, through the upsert and through the portable fallback
+
+import pytest
+from sqlalchemy import event
+
+import crud
+import database
+import score_events
+from models import ScoreEvent, StudentScore, UserModuleProgress, UserTotalScore
+
+
+@pytest.mark.parametrize("increment", [crud._increment_rows, crud._increment_rows_locked])
+def test_increment_inserts_then_adds(db, increment):
+    keys = ["user_id", "module_id"]
+    # Module 6 has no seeded scores, so the first call inserts
+    first = increment(db, StudentScore, keys, "total_score", [
+        {"user_id": 1, "module_id": 6, "total_score": 4.0},
+        {"user_id": 2, "module_id": 6, "total_score": 1.5},
+    ])
+    second = increment(db, StudentScore, keys, "total_score", [
+        {"user_id": 1, "module_id": 6, "total_score": 6.0},
+    ])
+
+    assert sorted((row.user_id, row.total_score) for row in first) == [(1, 4.0), (2, 1.5)]
+    assert [(row.user_id, row.total_score) for row in second] == [(1, 10.0)]
+    assert db.query(StudentScore).filter_by(user_id=1, module_id=6).one().total_score == 10.0
+
+
+def test_locked_increment_updates_other_columns(db, dataset):
+    before = db.query(UserTotalScore).filter_by(user_id=3).one().total_score
+    [row] = crud._increment_rows_locked(db, UserTotalScore, ["user_id"], "total_score", [
+        {"user_id": 3, "total_score": 2.0, "updated_at": None},
+    ])
+    assert row.total_score == before + 2.0
+    assert row.updated_at is None
+
+
+def test_completing_a_module_records_its_score_in_one_commit(db):
+    commits = []
+    record = commits.append
+    event.listen(database.engine, "commit", record)
+    try:
+        crud.update_module(db, 4, completed=True, user_id=2)
+    finally:
+        event.remove(database.engine, "commit", record)
+
+    assert len(commits) == 1
+    assert db.query(UserModuleProgress).filter_by(user_id=2, module_id=4).one().completed
+    if score_events.SCORE_WRITE_BEHIND:
+        assert db.query(ScoreEvent.delta).filter_by(user_id=2, module_id=4, folded_at=None).scalar() == 10.0
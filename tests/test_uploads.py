@@ -0,0 +1,145 @@
+# test_uploads.py - identical files from two teachers share a blob but keep their own names
+
+import hashlib
+import os
+import time
+
+import anyio
+import pytest
+from fastapi import HTTPException, Request
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+import crud
+import main
+import upload_store
+
+WORKSHEET = b"%PDF-1.4 counting worksheet"
+LETTERS = b"%PDF-1.4 letters worksheet"
+
+
+def teacher(dataset, user_id: int) -> TestClient:
+    return TestClient(main.app, cookies={"access_token": create_access_token({"sub": dataset.student_email(user_id)})})
+
+
+def upload(client: TestClient, name: str, content: bytes = WORKSHEET) -> dict:
+    response = client.post("/upload-pdf", files={"file": (name, content, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def teachers(dataset):
+    return teacher(dataset, 1), teacher(dataset, 2)
+
+
+def test_same_file_gets_a_name_per_upload(teachers):
+    first, second = teachers
+    a = upload(first, "counting.pdf")
+    b = upload(second, "numbers 1-10.pdf")
+
+    assert a["filename"] != b["filename"]
+    assert a["sha256"] == b["sha256"]
+    assert (a["original_name"], b["original_name"]) == ("counting.pdf", "numbers 1-10.pdf")
+    assert b["duplicate"]
+
+    listed = {f["filename"]: f for f in first.get("/uploads", params={"limit": 200}).json()["files"]}
+    assert listed[a["filename"]]["uploader_id"] == 1
+    assert listed[b["filename"]]["uploader_id"] == 2
+
+
+def test_deleting_one_name_keeps_the_other(teachers):
+    first, second = teachers
+    a = upload(first, "letters.pdf", LETTERS)
+    b = upload(second, "letters.pdf", LETTERS)
+    blob = upload_store.blob_path(a["sha256"])
+
+    assert first.get(f"/deletefile/{a['filename']}").status_code == 200
+    assert first.get(f"/files/{a['filename']}").status_code == 404
+    assert second.get(f"/files/{b['filename']}").content == LETTERS
+    assert os.path.exists(blob)
+
+    assert second.get(f"/deletefile/{b['filename']}").status_code == 200
+    assert not os.path.exists(blob)
+
+
+def streamed_request(headers: dict, chunks) -> tuple:
+    """A Request whose body arrives chunk by chunk; the list records how many chunks were read"""
+    read = []
+    chunks = iter(chunks)
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            read.append(len(chunk))
+        return {"type": "http.request", "body": chunk or b"", "more_body": chunk is not None}
+
+    scope = {"type": "http", "method": "POST", "path": "/upload-pdf",
+             "headers": [(k.encode(), v.encode()) for k, v in headers.items()]}
+    return Request(scope, receive), read
+
+
+def receive(request, upload_dir: str):
+    return anyio.run(upload_store.receive_pdf, request, upload_dir)
+
+
+def test_oversized_upload_is_refused_from_content_length(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "MAX_UPLOAD_BYTES", 1024)
+    length = upload_store.MAX_UPLOAD_BYTES + upload_store.MULTIPART_OVERHEAD + 1
+    request, read = streamed_request(
+        {"content-type": "multipart/form-data; boundary=x", "content-length": str(length)}, [b"x" * length])
+
+    with pytest.raises(HTTPException) as refused:
+        receive(request, str(tmp_path))
+    assert refused.value.status_code == 413
+    assert not read
+
+
+def test_upload_limit_is_enforced_while_streaming(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "MAX_UPLOAD_BYTES", 1024)
+    head = (b"--x\r\ncontent-disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\n"
+            b"content-type: application/pdf\r\n\r\n%PDF-1.4 ")
+    # No Content-Length, as with a chunked body: only the parser sees the size
+    request, read = streamed_request({"content-type": "multipart/form-data; boundary=x"},
+                                     [head] + [b"0" * 512] * 1000)
+
+    with pytest.raises(HTTPException) as refused:
+        receive(request, str(tmp_path))
+    assert refused.value.status_code == 413
+    assert len(read) <= 4
+    assert not list(tmp_path.iterdir())
+
+
+def test_upload_must_be_a_pdf(teachers):
+    response = teachers[0].post("/upload-pdf", files={"file": ("notes.pdf", b"plain text", "application/pdf")})
+    assert response.status_code == 400
+    response = teachers[0].post("/upload-pdf", files={"file": ("notes.txt", WORKSHEET, "text/plain")})
+    assert response.status_code == 400
+
+
+def write_blob(upload_dir: str, content: bytes, age_seconds: float = 0) -> str:
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = upload_store.blob_path(sha256, upload_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    settled = time.time() - age_seconds
+    os.utime(path, (settled, settled))
+    return sha256
+
+
+def test_reconcile_leaves_uploads_in_flight_alone(db, tmp_path):
+    upload_dir = str(tmp_path)
+    fresh = write_blob(upload_dir, b"%PDF-1.4 copied in just now")
+    old = write_blob(upload_dir, b"%PDF-1.4 restored from backup", age_seconds=3600)
+    (tmp_path / "1234_legacy.pdf").write_bytes(b"%PDF-1.4 legacy")
+    # A row whose blob is not stored yet, as between save_upload's commit and store_blob
+    pending = crud.create_uploaded_file(db, upload_store.upload_filename(), "f" * 64, "pending.pdf", 10)
+
+    result = upload_store.reconcile_uploads(db, upload_dir, grace_seconds=60)
+
+    assert result == {"added": 1, "removed": 0, "flat": 1}
+    known = crud.get_uploaded_file_hashes(db)
+    assert old in known and fresh not in known
+    assert crud.get_uploaded_file(db, pending.filename) is not None
+    assert (tmp_path / "1234_legacy.pdf").exists()
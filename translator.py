@@ -1,9 +1,294 @@
+# translator.py - translation memory in front of a pluggable translation backend
+
 import asyncio
-from googletrans import Translator
+import inspect
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "googletrans")  # "googletrans" or "echo"
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "translation_memory.sqlite3")
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "10000"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "25"))
+TRANSLATION_TIMEOUT = float(os.getenv("TRANSLATION_TIMEOUT", "5"))
+BREAKER_THRESHOLD = int(os.getenv("TRANSLATION_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("TRANSLATION_BREAKER_COOLDOWN", "30"))
+
+Key = Tuple[str, str, str]
+
+
+class TranslationUnavailable(Exception):
+    """Raised when the backend is failing (circuit open) or timed out"""
+
+    def __init__(self, message: str, retry_after: float = BREAKER_COOLDOWN):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def normalize(text: str) -> str:
+    """Memory key form of a string: NFC, trimmed, inner whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+# ==================== BACKENDS ====================
+
+class GoogleTranslateBackend:
+    """googletrans; handles both the async (4.x) and blocking (3.x) clients"""
+    name = "googletrans"
+
+    async def translate(self, texts: List[str], src: str, dest: str) -> List[str]:
+        from googletrans import Translator
+
+        translator = Translator()
+        if inspect.iscoroutinefunction(translator.translate):
+            results = await translator.translate(texts, src=src, dest=dest)
+        else:
+            results = await run_in_threadpool(translator.translate, texts, src=src, dest=dest)
+        return [result.text for result in results]
+
+class EchoBackend:
+    """Offline stand-in for local runs and tests: returns each text unchanged"""
+    name = "echo"
+
+    async def translate(self, texts: List[str], src: str, dest: str) -> List[str]:
+        return list(texts)
+
+BACKENDS = {
+    "googletrans": GoogleTranslateBackend,
+    "echo": EchoBackend,
+}
+
+
+# ==================== MEMORY ====================
+
+class TranslationMemory:
+    """LRU of recent translations over a SQLite table that survives restarts"""
+
+    def __init__(self, path: str = TRANSLATION_MEMORY_PATH, maxsize: int = TRANSLATION_CACHE_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._lru: "OrderedDict[Key, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " src TEXT NOT NULL, dest TEXT NOT NULL, source_text TEXT NOT NULL,"
+                " translated_text TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (src, dest, source_text))"
+            )
+        return self._conn
+
+    def _remember(self, key: Key, value: str):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get_cached(self, keys: List[Key]) -> Dict[Key, str]:
+        """In-process hits only; cheap enough to call on the event loop"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+        return found
+
+    def get_stored(self, keys: List[Key]) -> Dict[Key, str]:
+        """Look keys up in the SQLite store (blocking) and promote hits into the LRU"""
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for src, dest, text in keys:
+                row = conn.execute(
+                    "SELECT translated_text FROM translations WHERE src = ? AND dest = ? AND source_text = ?",
+                    (src, dest, text),
+                ).fetchone()
+                if row:
+                    found[(src, dest, text)] = row[0]
+                    self._remember((src, dest, text), row[0])
+        return found
+
+    def put_many(self, items: Dict[Key, str]):
+        """Store new translations in both tiers (blocking)"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                    [(src, dest, text, value, now) for (src, dest, text), value in items.items()],
+                )
+            for key, value in items.items():
+                self._remember(key, value)
+
+    def size(self) -> dict:
+        with self._lock:
+            stored = self._connection().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return {"lru_entries": len(self._lru), "stored_entries": stored}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ==================== CIRCUIT BREAKER ====================
+
+class CircuitBreaker:
+    """Stop calling the backend after BREAKER_THRESHOLD straight failures.
+
+    After BREAKER_COOLDOWN seconds calls are let through again; the first
+    success closes the circuit, a failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        if self.state == "open":
+            retry_after = self.cooldown - (time.monotonic() - self.opened_at)
+            raise TranslationUnavailable("Translation backend is unavailable", retry_after)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+
+# ==================== SERVICE ====================
+
+class TranslationService:
+    """Dedupe, answer from memory, send only misses to the backend"""
+
+    def __init__(self, backend=None, memory: Optional[TranslationMemory] = None,
+                 concurrency: int = TRANSLATION_CONCURRENCY, batch_size: int = TRANSLATION_BATCH_SIZE,
+                 timeout: float = TRANSLATION_TIMEOUT):
+        self.backend = backend or BACKENDS[TRANSLATION_BACKEND]()
+        self.memory = memory or TranslationMemory()
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.texts = 0
+        self.lru_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self.backend_errors = 0
+        self.latencies = deque(maxlen=1000)
+
+    def set_backend(self, backend):
+        self.backend = backend
+        self.breaker.record_success()
+
+    async def _call_backend(self, texts: List[str], src: str, dest: str) -> List[str]:
+        self.breaker.check()
+        async with self._semaphore:
+            started = time.perf_counter()
+            self.backend_calls += 1
+            try:
+                results = await asyncio.wait_for(self.backend.translate(texts, src, dest), self.timeout)
+                if len(results) != len(texts):
+                    raise ValueError("Backend returned the wrong number of translations")
+            except Exception as e:
+                self.backend_errors += 1
+                self.breaker.record_failure()
+                raise TranslationUnavailable(f"Translation backend failed: {e!r}", self.breaker.cooldown) from e
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+        self.breaker.record_success()
+        return results
+
+    async def translate_many(self, texts: List[str], src: str = "en", dest: str = "ta") -> List[str]:
+        """Translate texts in order; repeats and known strings never reach the backend"""
+        keys = [(src, dest, normalize(text)) for text in texts]
+        unique = list(dict.fromkeys(key for key in keys if key[2]))
+        self.texts += len(texts)
+
+        found = self.memory.get_cached(unique)
+        self.lru_hits += len(found)
+        pending = [key for key in unique if key not in found]
+        if pending:
+            stored = await run_in_threadpool(self.memory.get_stored, pending)
+            self.store_hits += len(stored)
+            found.update(stored)
+            pending = [key for key in pending if key not in stored]
+
+        if pending:
+            self.misses += len(pending)
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            results = await asyncio.gather(
+                *(self._call_backend([key[2] for key in batch], src, dest) for batch in batches),
+                return_exceptions=True
+            )
+            translated = {}
+            for batch, batch_results in zip(batches, results):
+                if not isinstance(batch_results, BaseException):
+                    translated.update(zip(batch, batch_results))
+            # Keep what did come back even if another batch failed
+            if translated:
+                await run_in_threadpool(self.memory.put_many, translated)
+            for batch_results in results:
+                if isinstance(batch_results, BaseException):
+                    raise batch_results
+            found.update(translated)
+
+        return [found.get(key, "") for key in keys]
+
+    async def translate(self, text: str, src: str = "en", dest: str = "ta") -> str:
+        return (await self.translate_many([text], src, dest))[0]
+
+    def stats(self) -> dict:
+        unique_lookups = self.lru_hits + self.store_hits + self.misses
+        latencies = sorted(self.latencies)
+        return {
+            "backend": self.backend.name,
+            "texts": self.texts,
+            "lru_hits": self.lru_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.lru_hits + self.store_hits) / unique_lookups, 4) if unique_lookups else None,
+            "backend_calls": self.backend_calls,
+            "backend_errors": self.backend_errors,
+            "backend_avg_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "backend_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else 0.0,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "concurrency": self.concurrency,
+            **self.memory.size(),
+        }
 
-async def Kids_translator():
-    translator = Translator()
-    result = await translator.translate("Hello, how are you?", src="en", dest="ta")
-    print(result.text)  # Output will be in Tamil
 
-asyncio.run(main())
+service = TranslationService()
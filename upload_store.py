@@ -0,0 +1,316 @@
+# upload_store.py - streaming, bounded-memory storage for uploaded PDFs
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart before 0.0.13
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read/write
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+PDF_MAGIC = b"%PDF-"
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+# Reconcile leaves blobs and rows younger than this alone: an upload in
+# progress has its row without the blob for a moment
+UPLOAD_RECONCILE_GRACE_SECONDS = float(os.getenv("UPLOAD_RECONCILE_GRACE_SECONDS", "900"))
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class PdfPart:
+    """MultipartParser callbacks that pick out one file field and queue its bytes.
+
+    The parser calls these synchronously from write(); receive_pdf drains
+    the queue after each network chunk so file writes can go to the
+    threadpool. Other fields are skipped without being buffered.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.filename = None  # set once the field's headers are parsed
+        self.chunks = []
+        self._in_file = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name != self.field or b"filename" not in options or self.filename is not None:
+            return
+        self.filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+        if not self.filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.chunks.append(data[start:end])
+
+    def on_part_end(self):
+        self._in_file = False
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def receive_pdf(request: Request, upload_dir: str = UPLOAD_DIR, field: str = "file"):
+    """Stream a multipart/form-data upload into a temp file inside upload_dir as it arrives.
+
+    The request body is parsed straight off the socket, so nothing is
+    spooled before these checks run: a Content-Length over the limit is
+    refused before any of the body is read, and MAX_UPLOAD_BYTES is
+    enforced chunk by chunk, together with the PDF magic bytes and the
+    SHA-256. Memory use is one network chunk whatever the file size.
+    File I/O runs on the threadpool.
+
+    Returns (original_name, temp_path, size, sha256_hex); the caller moves
+    temp_path into place with os.replace, which is atomic within upload_dir.
+    """
+    body_limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+    too_large = HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > body_limit:
+        raise too_large
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    part = PdfPart(field)
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-", suffix=".part")
+    out = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    head = b""
+    received = size = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_limit:
+                raise too_large
+            try:
+                parser.write(chunk)
+            except FormParserError:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+            data = part.take()
+            if not data:
+                continue
+            if len(head) < len(PDF_MAGIC):
+                head += data[:len(PDF_MAGIC) - len(head)]
+                if not PDF_MAGIC.startswith(head):
+                    raise HTTPException(status_code=400, detail="File is not a valid PDF")
+            size += len(data)
+            if size > MAX_UPLOAD_BYTES:
+                raise too_large
+            digest.update(data)
+            await run_in_threadpool(out.write, data)
+        if part.filename is None:
+            raise HTTPException(status_code=400, detail=f"No file in the '{field}' field")
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        if head != PDF_MAGIC:
+            raise HTTPException(status_code=400, detail="File is not a valid PDF")
+        await run_in_threadpool(out.close)
+    except BaseException:
+        out.close()
+        _discard(temp_path)
+        raise
+    return part.filename, temp_path, size, digest.hexdigest()
+
+
+# ==================== CONTENT-ADDRESSED LAYOUT ====================
+#
+# uploads/ab/cd/abcd...ef.pdf - blobs are named by SHA-256 and sharded two
+# levels deep so no directory grows past a few hundred entries. Uploads
+# get their own public name ("<uuid>.pdf") and uploaded_files row, so
+# identical files from two teachers share a blob but not a name.
+
+HASH_NAME = re.compile(r"^[0-9a-f]{64}\.pdf$")
+
+def hash_filename(sha256: str) -> str:
+    return f"{sha256}.pdf"
+
+def upload_filename() -> str:
+    """A fresh public name for one upload"""
+    return f"{uuid.uuid4().hex}.pdf"
+
+def blob_path(sha256: str, upload_dir: str = UPLOAD_DIR) -> str:
+    return os.path.join(upload_dir, sha256[:2], sha256[2:4], hash_filename(sha256))
+
+def store_blob(temp_path: str, sha256: str, upload_dir: str = UPLOAD_DIR) -> bool:
+    """Move a finished upload into its blob slot; False if that content was already stored.
+
+    Call it after the upload's row is committed: a delete removes the blob
+    only while no row references it, so once the row exists the blob found
+    here stays, and one removed just before is put back from temp_path.
+    """
+    path = blob_path(sha256, upload_dir)
+    if os.path.exists(path):
+        _discard(temp_path)
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_path, path)
+    return True
+
+def save_upload(db, temp_path: str, sha256: str, original_name: str, size: int,
+                uploader_id=None, upload_dir: str = UPLOAD_DIR):
+    """Record a finished upload under a new name, then store its blob; returns (row, blob_was_new)"""
+    import crud
+
+    try:
+        db_file = crud.create_uploaded_file(db, upload_filename(), sha256, original_name, size, uploader_id)
+    except BaseException:
+        _discard(temp_path)
+        raise
+    try:
+        stored = store_blob(temp_path, sha256, upload_dir)
+    except BaseException:
+        _discard(temp_path)
+        crud.delete_uploaded_file(db, db_file)
+        raise
+    return db_file, stored
+
+def remove_blob(sha256: str, upload_dir: str = UPLOAD_DIR):
+    _discard(blob_path(sha256, upload_dir))
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def flat_uploads(upload_dir: str = UPLOAD_DIR):
+    """Files still in the old flat uploads/ layout"""
+    for entry in os.scandir(upload_dir):
+        if entry.is_file() and entry.name.lower().endswith(".pdf"):
+            yield entry
+
+def migrate_flat_uploads(db, upload_dir: str = UPLOAD_DIR) -> int:
+    """Rehash files left in the old flat uploads/ layout and move them into blobs.
+
+    Each file keeps its old name as an UploadedFile row, so saved
+    /uploads/<uuid>_<name>.pdf URLs keep resolving. Safe to re-run; run it
+    once with `python upload_store.py migrate`, not from the app.
+    """
+    import crud
+
+    moved = 0
+    for entry in flat_uploads(upload_dir):
+        sha256 = hash_file(entry.path)
+        size = entry.stat().st_size
+        store_blob(entry.path, sha256, upload_dir)
+        if not crud.get_uploaded_file(db, entry.name):
+            original_name = entry.name.split("_", 1)[1] if "_" in entry.name else entry.name
+            crud.create_uploaded_file(db, entry.name, sha256, original_name, size)
+        moved += 1
+        print(f"Migrated {entry.name} -> {blob_path(sha256, upload_dir)}")
+    return moved
+
+def iter_blobs(upload_dir: str = UPLOAD_DIR):
+    """Yield (sha256, stat) for every blob in the sharded layout"""
+    for shard in os.scandir(upload_dir):
+        if not shard.is_dir() or len(shard.name) != 2:
+            continue
+        for subshard in os.scandir(shard.path):
+            if not subshard.is_dir():
+                continue
+            for entry in os.scandir(subshard.path):
+                if entry.is_file() and HASH_NAME.match(entry.name):
+                    yield entry.name[:-len(".pdf")], entry.stat()
+
+def reconcile_uploads(db, upload_dir: str = UPLOAD_DIR,
+                      grace_seconds: float = UPLOAD_RECONCILE_GRACE_SECONDS) -> dict:
+    """Bring uploaded_files back in line with blobs added or removed out of band.
+
+    Blobs with no row get one under their hash name, and rows whose blob is
+    gone are dropped; both only past grace_seconds, so uploads in flight are
+    left alone. Flat legacy files are only counted: moving them is the
+    migrate command's job. One directory walk plus one query for the
+    referenced hashes, so it runs off the request path.
+    """
+    import crud
+
+    known = crud.get_uploaded_file_hashes(db)
+    settled = time.time() - grace_seconds
+    on_disk = set()
+    added = 0
+    for sha256, stat in iter_blobs(upload_dir):
+        on_disk.add(sha256)
+        if sha256 not in known and stat.st_mtime < settled:
+            filename = hash_filename(sha256)
+            crud.create_uploaded_file(db, filename, sha256, filename, stat.st_size)
+            added += 1
+    removed = 0
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    for sha256 in known - on_disk:
+        removed += crud.delete_uploaded_files_by_hash(db, sha256, created_before=cutoff)
+    flat = sum(1 for _ in flat_uploads(upload_dir))
+    if flat:
+        print(f"{flat} uploads in the old flat layout; run `python upload_store.py migrate`")
+    return {"added": added, "removed": removed, "flat": flat}
+
+
+if __name__ == "__main__":
+    # python upload_store.py migrate | reconcile
+    import sys
+    from database import SessionLocal, Base, engine
+
+    if sys.argv[1:] not in (["migrate"], ["reconcile"]):
+        sys.exit("usage: python upload_store.py migrate|reconcile")
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if sys.argv[1] == "migrate":
+            print(f"Migrated {migrate_flat_uploads(db)} files")
+        else:
+            print(reconcile_uploads(db))
+    finally:
+        db.close()